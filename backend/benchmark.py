@@ -0,0 +1,310 @@
+"""Offline benchmarks for the analysis pipeline.
+
+Generates a synthetic frontend repo, serves llm_stub.py in-process in place of
+Gemini, and times each stage. Results are JSON so runs can be diffed:
+
+    python benchmark.py --files 500 --output before.json
+    python benchmark.py --files 500 --compare before.json
+
+Run from backend/. Caches, mirrors and job logs go to a temporary directory,
+and every run starts with cold caches unless --warm is given.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+WORK_DIR = tempfile.mkdtemp(prefix='reporeleaf_bench_')
+# Must be set before the modules below read their configuration
+for name, value in {
+    'ANALYSIS_CACHE_PATH': os.path.join(WORK_DIR, 'analysis_cache.db'),
+    'LLM_CACHE_PATH': os.path.join(WORK_DIR, 'llm_cache.db'),
+    'ORIGINALS_CACHE_PATH': os.path.join(WORK_DIR, 'originals_cache.db'),
+    'FILES_DB_PATH': os.path.join(WORK_DIR, 'files.db'),
+    'MIRROR_CACHE_DIR': os.path.join(WORK_DIR, 'mirrors'),
+    'JOBS_DIR': os.path.join(WORK_DIR, 'jobs'),
+    'LLM_STUB_LATENCY': os.getenv('LLM_STUB_LATENCY', '0.05'),
+    'LLM_STUB_RESPONSE': os.getenv('LLM_STUB_RESPONSE', '[]'),
+    'GEMINI_API_KEY': 'benchmark',
+}.items():
+    os.environ[name] = value
+
+import logging
+import uvicorn
+from git import Repo
+from PIL import Image
+
+import llm_stub
+import parser
+import server
+from llm_cache import llm_cache
+from llm_client import llm_client
+from scanner import scan_repo
+
+SIZE_CLASSES = {'small': 2 * 1024, 'medium': 20 * 1024, 'large': 200 * 1024}
+CODE_EXTS = ('.js', '.jsx', '.tsx', '.css', '.html')
+
+
+# Synthetic repository
+
+
+def _js(rng: random.Random, target: int, ext: str) -> str:
+    parts = ["import { helper } from './helper'\n"]
+    if ext == '.tsx':
+        parts.append('type Row = { id: number; name: string }\n')
+    n = 0
+    while sum(map(len, parts)) < target:
+        if rng.random() < 0.3:
+            body = f'  for (const a of xs) {{\n    for (const b of xs) {{ total += a * b }}\n  }}\n'
+        else:
+            body = f'  for (let i = 0; i < xs.length; i++) {{ total += xs[i] * {n} }}\n'
+        parts.append(f'export function fn{n}(xs) {{\n  let total = 0\n{body}  return helper(total)\n}}\n')
+        if ext in ('.jsx', '.tsx'):
+            parts.append(f'export const View{n} = () => <div className="c{n % 50} card">{{fn{n}([1, 2])}}</div>\n')
+        n += 1
+    return ''.join(parts)
+
+
+def _css(rng: random.Random, target: int) -> str:
+    rules = []
+    while sum(map(len, rules)) < target:
+        name = f'c{rng.randrange(100)}' if rng.random() < 0.7 else f'unused{rng.randrange(10000)}'
+        rules.append(f'.{name} {{ margin: 0.5em; color: #{rng.randrange(0xffffff):06x}; }}\n')
+    return ''.join(rules)
+
+
+def _html(rng: random.Random, target: int, images: List[str]) -> str:
+    parts = ['<!doctype html><html><head><link rel="stylesheet" href="styles.css"></head><body>\n']
+    while sum(map(len, parts)) < target:
+        parts.append(f'<div class="c{rng.randrange(100)} card"><p>Lorem ipsum dolor sit amet</p></div>\n')
+        if images and rng.random() < 0.05:
+            parts.append(f'<img src="{rng.choice(images)}">\n')
+    parts.append('</body></html>\n')
+    return ''.join(parts)
+
+
+def _image(rng: random.Random, path: str, size_class: str):
+    side = {'small': 64, 'medium': 512, 'large': 1400}[size_class]
+    img = Image.new('RGB', (side, side), tuple(rng.randrange(256) for _ in range(3)))
+    # A little noise so encoders have something to work with
+    pixels = img.load()
+    for _ in range(side * 4):
+        pixels[rng.randrange(side), rng.randrange(side)] = (rng.randrange(256), 0, 0)
+    img.save(path, quality=90)
+
+
+def generate_repo(root: str, files: int = 300, images: int = 20, depth: int = 3,
+                  size_mix: Dict[str, float] = None, seed: int = 0) -> Dict[str, Any]:
+    """Write a deterministic synthetic frontend under root; return its shape."""
+    rng = random.Random(seed)
+    size_mix = size_mix or {'small': 0.7, 'medium': 0.25, 'large': 0.05}
+    classes, weights = zip(*size_mix.items())
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, 'package.json'), 'w') as f:
+        json.dump({'name': 'synthetic', 'private': True}, f)
+
+    def random_dir() -> str:
+        parts = ['src'] + [f'd{rng.randrange(4)}' for _ in range(rng.randrange(depth + 1))]
+        path = os.path.join(root, *parts)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    image_paths = []
+    for i in range(images):
+        ext = rng.choice(('.png', '.jpg', '.webp'))
+        rel = os.path.join('assets', f'img{i}{ext}')
+        os.makedirs(os.path.join(root, 'assets'), exist_ok=True)
+        _image(rng, os.path.join(root, rel), rng.choices(classes, weights)[0])
+        image_paths.append(rel)
+
+    bytes_written = 0
+    for i in range(files):
+        ext = CODE_EXTS[i % len(CODE_EXTS)]
+        target = SIZE_CLASSES[rng.choices(classes, weights)[0]]
+        if ext == '.css':
+            content = _css(rng, target)
+        elif ext == '.html':
+            content = _html(rng, target, image_paths)
+        else:
+            content = _js(rng, target, ext)
+        with open(os.path.join(random_dir(), f'f{i}{ext}'), 'w') as f:
+            f.write(content)
+        bytes_written += len(content)
+
+    return {'files': files, 'images': images, 'depth': depth, 'size_mix': size_mix,
+            'seed': seed, 'code_bytes': bytes_written}
+
+
+def make_remote(repo_dir: str) -> str:
+    """Commit repo_dir and expose it as a bare file:// remote."""
+    work = Repo.init(repo_dir, initial_branch='main')
+    with work.config_writer() as cfg:
+        cfg.set_value('user', 'name', 'bench')
+        cfg.set_value('user', 'email', 'bench@example.com')
+    work.git.add('-A')
+    work.index.commit('synthetic repo')
+    bare = repo_dir.rstrip('/') + '.git'
+    Repo.clone_from(repo_dir, bare, bare=True)
+    Repo(bare).git.config('uploadpack.allowFilter', 'true')
+    return f'file://{bare}'
+
+
+# Gemini stub
+
+
+def start_llm_stub() -> uvicorn.Server:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    stub = uvicorn.Server(uvicorn.Config(llm_stub.app, host='127.0.0.1', port=port,
+                                         log_level='warning'))
+    threading.Thread(target=stub.run, daemon=True).start()
+    while not stub.started:
+        time.sleep(0.01)
+    llm_client.base_url = f'http://127.0.0.1:{port}'
+    return stub
+
+
+# Benchmarks
+
+
+async def _drain(gen) -> int:
+    n = 0
+    async for _ in gen:
+        n += 1
+    return n
+
+
+def run_case(fn: Callable[[], Any], repeat: int, warm: bool) -> Dict[str, Any]:
+    runs = []
+    for _ in range(repeat):
+        if not warm:
+            parser.analysis_cache.clear()
+            llm_cache.clear()
+        start = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - start)
+    return {'runs': runs, 'min': min(runs), 'median': statistics.median(runs),
+            'mean': statistics.mean(runs)}
+
+
+def benchmark(repo_dir: str, url: str, repeat: int, warm: bool,
+              only: List[str] = None) -> Dict[str, Dict[str, Any]]:
+    cases = {
+        'scan_repo': lambda: scan_repo(repo_dir),
+        'compute_metrics': lambda: parser.compute_metrics(scan_repo(repo_dir)),
+        'check_guidelines_static': lambda: parser.check_guidelines_static(scan_repo(repo_dir)),
+        'parse': lambda: asyncio.run(_drain(parser.parse(repo_dir))),
+        'analysis_generator': lambda: asyncio.run(_drain(server.analysis_generator(url))),
+    }
+    results = {}
+    for name, fn in cases.items():
+        if only and name not in only:
+            continue
+        print(f'Running {name}...', file=sys.stderr)
+        results[name] = run_case(fn, repeat, warm)
+    return results
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> bool:
+    """Print median ratios against a baseline; True if any case regressed."""
+    regressed = False
+    if baseline.get('repo') != results['repo']:
+        print('warning: baseline was generated with a different repo shape', file=sys.stderr)
+    for name, current in results['results'].items():
+        before = baseline.get('results', {}).get(name)
+        if not before:
+            continue
+        ratio = current['median'] / before['median'] if before['median'] else float('inf')
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = '  REGRESSION'
+            regressed = True
+        print(f'{name:26s} {before["median"]:9.3f}s -> {current["median"]:9.3f}s  x{ratio:.2f}{flag}',
+              file=sys.stderr)
+    return regressed
+
+
+def parse_size_mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for part in value.split(','):
+        name, weight = part.split('=')
+        if name not in SIZE_CLASSES:
+            raise argparse.ArgumentTypeError(f'unknown size class {name}')
+        mix[name] = float(weight)
+    return mix
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--files', type=int, default=300)
+    ap.add_argument('--images', type=int, default=20)
+    ap.add_argument('--depth', type=int, default=3)
+    ap.add_argument('--size-mix', type=parse_size_mix, default='small=0.7,medium=0.25,large=0.05')
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('--repeat', type=int, default=3)
+    ap.add_argument('--warm', action='store_true', help='keep caches between runs')
+    ap.add_argument('--only', nargs='*', help='benchmark names to run')
+    ap.add_argument('--output', help='write JSON results here instead of stdout')
+    ap.add_argument('--compare', help='baseline JSON to compare medians against')
+    ap.add_argument('--threshold', type=float, default=0.1,
+                    help='relative slowdown reported as a regression')
+    args = ap.parse_args()
+
+    logging.disable(logging.INFO)
+    try:
+        repo_dir = os.path.join(WORK_DIR, 'repo')
+        shape = generate_repo(repo_dir, args.files, args.images, args.depth,
+                              args.size_mix, args.seed)
+        url = make_remote(repo_dir)
+        stub = start_llm_stub()
+
+        results = {
+            'repo': shape,
+            'config': {'repeat': args.repeat, 'warm': args.warm,
+                       'llm_stub_latency': float(os.environ['LLM_STUB_LATENCY'])},
+            'env': {'python': platform.python_version(), 'platform': platform.platform(),
+                    'cpus': os.cpu_count(), 'revision': git_revision()},
+        }
+        # Pipeline code prints model output; keep stdout for the JSON
+        with contextlib.redirect_stdout(sys.stderr):
+            results['results'] = benchmark(repo_dir, url, args.repeat, args.warm, args.only)
+        stub.should_exit = True
+
+        out = json.dumps(results, indent=2)
+        if args.output:
+            with open(args.output, 'w') as f:
+                f.write(out + '\n')
+        else:
+            print(out)
+
+        if args.compare:
+            with open(args.compare) as f:
+                if compare(results, json.load(f), args.threshold):
+                    sys.exit(1)
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class DiskCache:
+    """SQLite-backed key/value cache with a byte cap, LRU eviction and optional TTL."""
+
+    def __init__(self, path: str, max_bytes: int, ttl: Optional[float] = None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL,
+                created_at REAL NOT NULL DEFAULT 0
+            )
+        ''')
+        columns = [r[1] for r in self._conn.execute('PRAGMA table_info(cache)')]
+        if 'created_at' not in columns:
+            self._conn.execute(
+                'ALTER TABLE cache ADD COLUMN created_at REAL NOT NULL DEFAULT 0')
+        self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS cache_last_access ON cache (last_access)')
+        self._conn.commit()
+        row = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM cache').fetchone()
+        self._total_bytes = row[0]
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hit_rate, 'bytes': self._total_bytes}
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT value, size, created_at FROM cache WHERE key = ?', (key,)).fetchone()
+            if row is not None and self.ttl is not None and now - row[2] > self.ttl:
+                self._conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+                self._total_bytes -= row[1]
+                self._conn.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute(
+                'UPDATE cache SET last_access = ? WHERE key = ?', (now, key))
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any):
+        data = json.dumps(value)
+        size = len(data)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._conn.execute(
+                'SELECT size FROM cache WHERE key = ?', (key,)).fetchone()
+            now = time.time()
+            self._conn.execute(
+                'INSERT OR REPLACE INTO cache (key, value, size, last_access, created_at) '
+                'VALUES (?, ?, ?, ?, ?)', (key, data, size, now, now))
+            self._total_bytes += size - (old[0] if old else 0)
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        # Drop least recently used entries until we are back under the cap
+        while self._total_bytes > self.max_bytes:
+            rows = self._conn.execute(
+                'SELECT key, size FROM cache ORDER BY last_access LIMIT 64').fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                self._conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+                self._total_bytes -= size
+                if self._total_bytes <= self.max_bytes:
+                    break
+        logger.debug('Cache %s holds %d bytes', self.path, self._total_bytes)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM cache')
+            self._conn.commit()
+            self._total_bytes = 0
@@ -0,0 +1,20 @@
+import os
+import shutil
+import tempfile
+
+# Stores and caches open their files at import time, so redirect them before
+# any test module imports storage, parser or server. Otherwise a test run
+# writes into the tracked files.db and leaves caches behind in backend/.
+TEST_DATA_DIR = tempfile.mkdtemp(prefix='backend-tests-')
+
+for name, filename in [('FILES_DB_PATH', 'files.db'),
+                       ('ANALYSIS_CACHE_PATH', 'analysis_cache.db'),
+                       ('LLM_CACHE_PATH', 'llm_cache.db'),
+                       ('ORIGINALS_CACHE_PATH', 'originals_cache.db'),
+                       ('JOBS_DIR', 'jobs'),
+                       ('MIRROR_CACHE_DIR', 'repo_mirrors')]:
+    os.environ[name] = os.path.join(TEST_DATA_DIR, filename)
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(TEST_DATA_DIR, ignore_errors=True)
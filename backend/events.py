@@ -0,0 +1,25 @@
+import difflib
+import json
+from typing import Any
+from regions import split_lines
+
+NO_NEWLINE = '\\ No newline at end of file\n'
+
+
+def sse_event(event: str, data: Any) -> str:
+    """A named SSE event with a JSON payload; clients listen with addEventListener."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def unified_diff(path: str, original: str, optimized: str) -> str:
+    """Unified diff of original -> optimized that `diff`'s applyPatch can replay."""
+    out = []
+    # str.splitlines also breaks on \x0c, \u2028 and friends, which patch does not
+    for line in difflib.unified_diff(split_lines(original), split_lines(optimized),
+                                     f'a/{path}', f'b/{path}'):
+        if line.endswith('\n'):
+            out.append(line)
+        else:
+            # difflib leaves the last line bare; patch tools expect a marker
+            out.append(line + '\n' + NO_NEWLINE)
+    return ''.join(out)
@@ -0,0 +1,112 @@
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from PIL import Image, features
+
+logger = logging.getLogger(__name__)
+
+# Pillow releases the GIL while decoding and encoding, so threads scale here
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', os.cpu_count() or 4))
+# Re-encode images to measure what a modern format would actually save
+IMAGE_TRANSCODE = os.getenv('IMAGE_TRANSCODE', '1') == '1'
+IMAGE_TRANSCODE_FORMATS = [
+    f.strip().lower() for f in os.getenv('IMAGE_TRANSCODE_FORMATS', 'webp').split(',') if f.strip()
+]
+IMAGE_QUALITY = int(os.getenv('IMAGE_QUALITY', 75))
+# Decoding huge images dominates scan time; report dimensions only above this
+IMAGE_TRANSCODE_MAX_PIXELS = int(os.getenv('IMAGE_TRANSCODE_MAX_PIXELS', 16_000_000))
+
+OVERSIZED_PIXELS = 1_000_000
+MODERN_IMAGE_FORMATS = ('WEBP', 'AVIF')
+
+for _fmt in list(IMAGE_TRANSCODE_FORMATS):
+    if not features.check(_fmt):
+        logger.warning(f"Pillow lacks {_fmt} support, skipping {_fmt} estimates")
+        IMAGE_TRANSCODE_FORMATS.remove(_fmt)
+
+
+def transcode_settings() -> str:
+    """Part of the cache key: results change whenever these do."""
+    formats = ','.join(IMAGE_TRANSCODE_FORMATS) if IMAGE_TRANSCODE else ''
+    return f'{formats}:{IMAGE_QUALITY}:{IMAGE_TRANSCODE_MAX_PIXELS}'
+
+
+def _encoded_sizes(img: Image.Image) -> Dict[str, int]:
+    # Flat graphics often compress better losslessly; report the better of the two
+    try_lossless = img.format in ('PNG', 'GIF')
+    if img.mode not in ('RGB', 'RGBA'):
+        has_alpha = img.mode in ('LA', 'PA') or 'transparency' in img.info
+        img = img.convert('RGBA' if has_alpha else 'RGB')
+    sizes = {}
+    for fmt in IMAGE_TRANSCODE_FORMATS:
+        buf = io.BytesIO()
+        img.save(buf, format=fmt.upper(), quality=IMAGE_QUALITY)
+        sizes[fmt] = buf.tell()
+        if try_lossless and fmt == 'webp':
+            buf = io.BytesIO()
+            img.save(buf, format='WEBP', lossless=True)
+            sizes[fmt] = min(sizes[fmt], buf.tell())
+    return sizes
+
+
+def analyze_image(path: str) -> Optional[Dict[str, Any]]:
+    """Dimensions from the header, plus re-encoded sizes when enabled.
+
+    Image.open only parses the header; pixels are decoded solely for the
+    transcode, and only for still images under the pixel limit.
+    """
+    try:
+        with Image.open(path) as img:
+            width, height = img.size
+            result = {
+                'format': img.format,
+                'width': width,
+                'height': height,
+                'bytes': os.path.getsize(path),
+                'transcoded': {},
+            }
+            if (IMAGE_TRANSCODE and IMAGE_TRANSCODE_FORMATS
+                    and img.format not in MODERN_IMAGE_FORMATS
+                    and not getattr(img, 'is_animated', False)
+                    and width * height <= IMAGE_TRANSCODE_MAX_PIXELS):
+                result['transcoded'] = _encoded_sizes(img)
+            return result
+    except Exception as e:
+        logger.warning(f"Image analysis failed for {path}: {str(e)}")
+        return None
+
+
+_image_pool = None
+
+
+def analyze_images(paths: List[str]) -> List[Optional[Dict[str, Any]]]:
+    """analyze_image over paths on a shared thread pool, in input order."""
+    global _image_pool
+    if len(paths) <= 1 or IMAGE_WORKERS <= 1:
+        return [analyze_image(p) for p in paths]
+    if _image_pool is None:
+        _image_pool = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix='image')
+    return list(_image_pool.map(analyze_image, paths))
+
+
+def image_issues(ext: str, analysis: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Issues for one image; LegacyImageFormat carries the measured saving."""
+    issues = []
+    if analysis is None:
+        # Unreadable by Pillow; fall back to judging by extension
+        if ext not in ('.webp', '.avif'):
+            issues.append({'type': 'LegacyImageFormat', 'severity': 'High', 'weight': 3})
+        return issues
+
+    if analysis['format'] not in MODERN_IMAGE_FORMATS:
+        transcoded = analysis['transcoded']
+        saving = analysis['bytes'] - min(transcoded.values()) if transcoded else None
+        # A measured re-encode that saves nothing is not worth flagging
+        if saving is None or saving > 0:
+            issues.append({'type': 'LegacyImageFormat', 'severity': 'High', 'weight': 3,
+                           'estimated_savings_bytes': saving})
+    if analysis['width'] * analysis['height'] > OVERSIZED_PIXELS:
+        issues.append({'type': 'OversizedImage', 'severity': 'Medium', 'weight': 2})
+    return issues
@@ -0,0 +1,156 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from typing import AsyncIterator, Callable, Dict, Hashable, List, Optional, Tuple
+from events import sse_event
+from telemetry import ACTIVE_JOBS
+
+logger = logging.getLogger(__name__)
+
+JOBS_DIR = os.getenv('JOBS_DIR', 'jobs')
+# Finished jobs stay in memory this long; after that they replay from disk
+JOB_RETENTION = float(os.getenv('JOB_RETENTION', 3600))
+
+
+class Job:
+    """A background run whose SSE messages are kept in an append-only log."""
+
+    def __init__(self, job_id: str, log_path: str, key: Optional[Hashable] = None):
+        self.id = job_id
+        self.log_path = log_path
+        self.key = key
+        self.events: List[str] = []
+        self.done = False
+        self.failed = False
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self._cond = asyncio.Condition()
+
+    @classmethod
+    def load(cls, job_id: str, log_path: str) -> 'Job':
+        """Rebuild a job from its log, e.g. after a restart; it is never live.
+
+        A log without its done record belongs to a run the restart cut
+        short; it replays with a trailing failed event so clients stop.
+        """
+        job = cls(job_id, log_path)
+        finished = False
+        with open(log_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                if 'msg' in record:
+                    job.events.append(record['msg'])
+                finished = finished or record.get('done', False)
+        if not finished:
+            job.failed = True
+            job.events.append(sse_event('failed', {'message': 'Analysis was interrupted'}))
+        job.done = True
+        job.finished_at = os.path.getmtime(log_path)
+        return job
+
+    def _write(self, record: Dict):
+        with open(self.log_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + '\n')
+
+    async def append(self, msg: str):
+        self._write({'id': len(self.events), 'msg': msg})
+        async with self._cond:
+            self.events.append(msg)
+            self._cond.notify_all()
+
+    async def finish(self):
+        self._write({'done': True})
+        async with self._cond:
+            self.done = True
+            self.finished_at = time.time()
+            self._cond.notify_all()
+
+    async def tail(self, after: int = -1) -> AsyncIterator[Tuple[int, str]]:
+        """Replay messages with id > after, then follow until the job ends."""
+        n = after + 1
+        while True:
+            while n < len(self.events):
+                yield n, self.events[n]
+                n += 1
+            if self.done:
+                return
+            async with self._cond:
+                await self._cond.wait_for(lambda: n < len(self.events) or self.done)
+
+
+class JobManager:
+    def __init__(self, jobs_dir: str = JOBS_DIR, retention: float = JOB_RETENTION):
+        self.jobs_dir = jobs_dir
+        self.retention = retention
+        self.jobs: Dict[str, Job] = {}
+        # Latest job per dedupe key, for single-flight coalescing
+        self._by_key: Dict[Hashable, Job] = {}
+        os.makedirs(jobs_dir, exist_ok=True)
+
+    def _log_path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f'{job_id}.jsonl')
+
+    def find(self, key: Hashable, max_age: float) -> Optional[Job]:
+        """A running job for key, or one that succeeded within max_age seconds."""
+        job = self._by_key.get(key)
+        if job is None or job.failed:
+            return None
+        if job.done and time.time() - job.finished_at > max_age:
+            return None
+        return job
+
+    def start(self, run: Callable[[Job], AsyncIterator[str]],
+              key: Optional[Hashable] = None) -> Job:
+        """Run run(job) in the background, logging every message it yields."""
+        self._prune()
+        job_id = uuid.uuid4().hex
+        job = Job(job_id, self._log_path(job_id), key)
+        self.jobs[job_id] = job
+        if key is not None:
+            self._by_key[key] = job
+
+        async def drive():
+            ACTIVE_JOBS.inc()
+            try:
+                async for msg in run(job):
+                    await job.append(msg)
+            except Exception as e:
+                logger.error(f"Job {job_id} failed: {str(e)}")
+                job.failed = True
+                await job.append(f"data: ❌ Server error: {str(e)}\n\n")
+                await job.append(sse_event('failed', {'message': f'Server error: {str(e)}'}))
+            finally:
+                ACTIVE_JOBS.dec()
+                await job.finish()
+
+        job.task = asyncio.create_task(drive())
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return job
+        # Only accept ids we could have generated before touching the disk
+        if len(job_id) != 32 or not all(c in '0123456789abcdef' for c in job_id):
+            return None
+        path = self._log_path(job_id)
+        if not os.path.exists(path):
+            return None
+        return Job.load(job_id, path)
+
+    def _prune(self):
+        now = time.time()
+        for job_id, job in list(self.jobs.items()):
+            if job.done and now - job.finished_at > self.retention:
+                del self.jobs[job_id]
+                if self._by_key.get(job.key) is job:
+                    del self._by_key[job.key]
+
+
+async def sse_stream(job: Job, after: int = -1) -> AsyncIterator[str]:
+    """Format job messages as SSE, tagging each with its id for Last-Event-ID."""
+    async for n, msg in job.tail(after):
+        yield f"id: {n}\n{msg}"
@@ -0,0 +1,31 @@
+import contextvars
+import hashlib
+import json
+import os
+from typing import Any, Dict, Optional
+from cache import DiskCache
+
+LLM_CACHE_PATH = os.getenv('LLM_CACHE_PATH', 'llm_cache.db')
+LLM_CACHE_MAX_MB = int(os.getenv('LLM_CACHE_MAX_MB', 64))
+LLM_CACHE_TTL = float(os.getenv('LLM_CACHE_TTL', 7 * 24 * 3600))
+
+llm_cache = DiskCache(LLM_CACHE_PATH, LLM_CACHE_MAX_MB * 1024 * 1024, ttl=LLM_CACHE_TTL)
+
+# Skip cache reads (responses are still stored); set per request or via env
+llm_cache_bypass: contextvars.ContextVar[bool] = contextvars.ContextVar(
+    'llm_cache_bypass', default=os.getenv('LLM_CACHE_BYPASS', '0') == '1')
+
+
+def llm_cache_key(model: str, config: Dict[str, Any], prompt: str) -> str:
+    payload = json.dumps([model, config, prompt], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def get_cached_response(model: str, config: Dict[str, Any], prompt: str) -> Optional[str]:
+    if llm_cache_bypass.get():
+        return None
+    return llm_cache.get(llm_cache_key(model, config, prompt))
+
+
+def store_response(model: str, config: Dict[str, Any], prompt: str, text: str):
+    llm_cache.set(llm_cache_key(model, config, prompt), text)
@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+import httpx
+from dotenv import load_dotenv
+from telemetry import record_llm_call
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Point GEMINI_BASE_URL at llm_stub.py to run without the real API
+GEMINI_BASE_URL = os.getenv('GEMINI_BASE_URL', 'https://generativelanguage.googleapis.com')
+GEMINI_API_VERSION = os.getenv('GEMINI_API_VERSION', 'v1beta')
+LLM_MAX_CONNECTIONS = int(os.getenv('LLM_MAX_CONNECTIONS', 20))
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', 120))
+
+
+class LLMError(Exception):
+    pass
+
+
+class RateLimiter:
+    """Space out request starts to at most `rate` per second."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class LLMClient:
+    """Async Gemini generateContent client sharing one pooled HTTP connection."""
+
+    def __init__(self, api_key: Optional[str] = None, base_url: str = GEMINI_BASE_URL,
+                 api_version: str = GEMINI_API_VERSION,
+                 max_connections: int = LLM_MAX_CONNECTIONS, timeout: float = LLM_TIMEOUT,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.api_key = api_key if api_key is not None else os.getenv('GEMINI_API_KEY')
+        self.base_url = base_url.rstrip('/')
+        self.api_version = api_version
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.transport = transport
+        # A pool belongs to the event loop that created it: loop -> (client, closer task)
+        self._clients: Dict[asyncio.AbstractEventLoop, Tuple[httpx.AsyncClient, asyncio.Task]] = {}
+
+    def _client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        entry = self._clients.get(loop)
+        if entry is None or entry[0].is_closed:
+            http = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                transport=self.transport,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+            )
+            entry = (http, loop.create_task(self._close_with_loop(loop, http)))
+            self._clients[loop] = entry
+        return entry[0]
+
+    async def _close_with_loop(self, loop: asyncio.AbstractEventLoop, http: httpx.AsyncClient):
+        """Close http once its loop winds down.
+
+        asyncio.run (and so uvicorn) cancels leftover tasks before closing the
+        loop, which is the last point its connections can still be closed.
+        """
+        try:
+            await loop.create_future()
+        finally:
+            if self._clients.get(loop, (None,))[0] is http:
+                del self._clients[loop]
+            await http.aclose()
+
+    async def generate(self, prompt: str, model: str,
+                       config: Optional[Dict[str, Any]] = None) -> str:
+        body: Dict[str, Any] = {'contents': [{'role': 'user', 'parts': [{'text': prompt}]}]}
+        if config:
+            body['generationConfig'] = config
+        start = time.perf_counter()
+        try:
+            resp = await self._client().post(
+                f'/{self.api_version}/models/{model}:generateContent',
+                json=body,
+                headers={'x-goog-api-key': self.api_key or ''},
+            )
+        except httpx.HTTPError:
+            record_llm_call(model, time.perf_counter() - start, 'error')
+            raise
+        elapsed = time.perf_counter() - start
+        if resp.status_code != 200:
+            record_llm_call(model, elapsed, f'http_{resp.status_code}')
+            raise LLMError(f'Gemini returned {resp.status_code}: {resp.text[:200]}')
+        data = resp.json()
+        record_llm_call(model, elapsed, 'ok', data.get('usageMetadata'))
+        try:
+            parts = data['candidates'][0]['content']['parts']
+        except (KeyError, IndexError) as e:
+            raise LLMError(f'Unexpected Gemini response: {data}') from e
+        return ''.join(part.get('text', '') for part in parts)
+
+    async def aclose(self):
+        """Close the current loop's pool now instead of at loop shutdown."""
+        entry = self._clients.pop(asyncio.get_running_loop(), None)
+        if entry is not None:
+            http, closer = entry
+            closer.cancel()
+            await http.aclose()
+
+
+llm_client = LLMClient()
@@ -0,0 +1,32 @@
+# Offline stand-in for the Gemini generateContent API, for load tests:
+#   uvicorn llm_stub:app --port 8001
+#   GEMINI_BASE_URL=http://localhost:8001 uvicorn server:app
+import asyncio
+import os
+from fastapi import FastAPI, Request
+
+LLM_STUB_LATENCY = float(os.getenv('LLM_STUB_LATENCY', 0.5))
+LLM_STUB_RESPONSE = os.getenv('LLM_STUB_RESPONSE', '[]')
+
+app = FastAPI()
+
+
+@app.post("/{api_version}/models/{model_action}")
+async def generate_content(api_version: str, model_action: str, request: Request):
+    body = await request.json()
+    await asyncio.sleep(LLM_STUB_LATENCY)
+    prompt = ''.join(p.get('text', '') for c in body.get('contents', []) for p in c.get('parts', []))
+    # Roughly four characters per token, like the real tokenizer on English
+    prompt_tokens = len(prompt) // 4
+    output_tokens = len(LLM_STUB_RESPONSE) // 4
+    return {
+        "candidates": [{
+            "content": {"role": "model", "parts": [{"text": LLM_STUB_RESPONSE}]},
+            "finishReason": "STOP",
+        }],
+        "usageMetadata": {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": output_tokens,
+            "totalTokenCount": prompt_tokens + output_tokens,
+        },
+    }
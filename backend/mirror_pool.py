@@ -0,0 +1,185 @@
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+from git import Git, GitCommandError, Repo
+
+logger = logging.getLogger(__name__)
+
+MIRROR_CACHE_DIR = os.getenv(
+    'MIRROR_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'repo_mirrors'))
+MIRROR_CACHE_MAX_MB = int(os.getenv('MIRROR_CACHE_MAX_MB', 2048))
+# Blobs above this size are left on the server until a checkout needs them
+MIRROR_BLOB_LIMIT = os.getenv('MIRROR_BLOB_LIMIT', '1m')
+
+LAST_USED_MARKER = 'reporeleaf-last-used'
+
+
+def normalize_repo_url(url: str) -> str:
+    """Canonical form of a repository URL, so equivalent spellings share a key."""
+    url = url.strip().rstrip('/')
+    if url.endswith('.git'):
+        url = url[:-4]
+    parsed = urlparse(url)
+    if parsed.scheme in ('http', 'https'):
+        host = (parsed.hostname or '').lower()
+        path = parsed.path.lower() if host == 'github.com' else parsed.path
+        return f'{host}{path}'
+    return url
+
+
+def is_commit_sha(ref: str) -> bool:
+    return len(ref) == 40 and all(c in '0123456789abcdef' for c in ref.lower())
+
+
+def valid_ref(ref: str) -> bool:
+    """A full commit sha or a well-formed ref name; never anything git reads as an option."""
+    if not ref or ref.startswith('-'):
+        return False
+    if is_commit_sha(ref):
+        return True
+    try:
+        Git().check_ref_format('--allow-onelevel', ref)
+    except GitCommandError:
+        return False
+    return True
+
+
+def _check_ref(ref: Optional[str]):
+    if ref is not None and not valid_ref(ref):
+        raise ValueError(f'Invalid git ref: {ref!r}')
+
+
+def resolve_commit(url: str, ref: Optional[str] = None) -> Optional[str]:
+    """Resolve ref (default HEAD) on the remote without fetching anything."""
+    _check_ref(ref)
+    if ref and is_commit_sha(ref):
+        return ref.lower()
+    out = Git().ls_remote('--end-of-options', url, ref or 'HEAD')
+    return out.split()[0] if out else None
+
+
+class MirrorPool:
+    """Shallow, blob-filtered bare mirrors keyed by URL, checked out as worktrees."""
+
+    def __init__(self, cache_dir: str = MIRROR_CACHE_DIR,
+                 max_bytes: int = MIRROR_CACHE_MAX_MB * 1024 * 1024,
+                 blob_limit: str = MIRROR_BLOB_LIMIT):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.blob_limit = blob_limit
+        self._lock = threading.Lock()
+        self._url_locks: Dict[str, threading.Lock] = {}
+        # worktree path -> mirror path, for release() and eviction
+        self._worktrees: Dict[str, str] = {}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def mirror_path(self, url: str) -> str:
+        key = hashlib.sha1(normalize_repo_url(url).encode()).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f'{key}.git')
+
+    def _url_lock(self, url: str) -> threading.Lock:
+        # Keyed like the mirror directory, so every spelling of a repo shares one lock
+        key = normalize_repo_url(url)
+        with self._lock:
+            return self._url_locks.setdefault(key, threading.Lock())
+
+    def fetch(self, url: str, ref: Optional[str] = None) -> Tuple[str, str]:
+        """Create or refresh the mirror for url; return (mirror path, commit sha)."""
+        _check_ref(ref)
+        path = self.mirror_path(url)
+        filter_spec = f'blob:limit={self.blob_limit}'
+        with self._url_lock(url):
+            if not os.path.isdir(path):
+                logger.info('Creating mirror for %s', url)
+                repo = Repo.clone_from(url, path, bare=True, depth=1,
+                                       single_branch=True, filter=filter_spec)
+                sha = repo.head.commit.hexsha
+            else:
+                logger.info('Refreshing mirror for %s', url)
+                repo = Repo(path)
+                ref = ref or 'HEAD'
+            if ref:
+                repo.git.fetch('--depth', '1', f'--filter={filter_spec}', '--end-of-options',
+                              'origin', ref)
+                # FETCH_HEAD is shared, so resolve it while we still hold the lock
+                sha = repo.git.rev_parse('FETCH_HEAD')
+            self._touch(path)
+        self.evict()
+        return path, sha
+
+    def checkout(self, url: str, dest: str, ref: Optional[str] = None) -> str:
+        """Materialize url at dest as a detached worktree; return the commit sha."""
+        mirror, sha = self.fetch(url, ref)
+        with self._url_lock(url):
+            Repo(mirror).git.worktree('add', '--detach', dest, sha)
+        with self._lock:
+            self._worktrees[os.path.abspath(dest)] = mirror
+        return sha
+
+    def changed_paths(self, url: str, base_sha: str, head_sha: str) -> Dict[str, str]:
+        """Map each path changed between two fetched commits to A, M or D."""
+        out = Repo(self.mirror_path(url)).git.diff(
+            '--name-status', '--no-renames', '-z', base_sha, head_sha)
+        fields = [f for f in out.split('\0') if f]
+        return {path: status[0] for status, path in zip(fields[::2], fields[1::2])}
+
+    def release(self, dest: str):
+        """Drop a worktree created by checkout(); the mirror stays cached."""
+        with self._lock:
+            mirror = self._worktrees.pop(os.path.abspath(dest), None)
+        if mirror is None:
+            return
+        try:
+            repo = Repo(mirror)
+            repo.git.worktree('remove', '--force', dest)
+            repo.git.worktree('prune')
+        except Exception as e:
+            logger.warning(f"Failed to remove worktree {dest}: {str(e)}")
+
+    def evict(self):
+        """Remove least recently used mirrors until the pool fits in max_bytes."""
+        with self._lock:
+            in_use = set(self._worktrees.values())
+        mirrors = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if os.path.isdir(path):
+                mirrors.append((self._last_used(path), _disk_usage(path), path))
+        total = sum(size for _, size, _ in mirrors)
+        for _, size, path in sorted(mirrors):
+            if total <= self.max_bytes:
+                break
+            if path in in_use:
+                continue
+            logger.info('Evicting mirror %s (%d bytes)', path, size)
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    @staticmethod
+    def _touch(path: str):
+        with open(os.path.join(path, LAST_USED_MARKER), 'w') as f:
+            f.write(str(time.time()))
+
+    @staticmethod
+    def _last_used(path: str) -> float:
+        try:
+            return os.path.getmtime(os.path.join(path, LAST_USED_MARKER))
+        except OSError:
+            return 0.0
+
+
+def _disk_usage(path: str) -> int:
+    total = 0
+    for dirpath, _, files in os.walk(path):
+        for f in files:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, f))
+            except OSError:
+                continue
+    return total
@@ -3,20 +3,33 @@ import tempfile
 import os
 import shutil
 import gzip
+import zlib
 import re
 import json
 import logging
 import time
-from typing import List, Dict, Any
+import multiprocessing
+from typing import List, Dict, Any, Callable, Optional, Set, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from git import Repo
 from dotenv import load_dotenv
 from pydantic import ValidationError
-from google import genai
-from google.genai import types
 from schemas import BaseIssue, EnrichedIssue
-from PIL import Image
-import esprima
+from scanner import FileEntry, FileIndex, decode_text, scan_repo
+from cache import DiskCache
+from llm_cache import get_cached_response, llm_cache, llm_cache_bypass, store_response
+from llm_client import RateLimiter, llm_client
+from images import analyze_images, image_issues, transcode_settings
 from radon.complexity import cc_visit
+from rules import rule_timings, run_js_rules
+from sampling import estimate_tokens, pack_samples
+from telemetry import span, timed
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 
 # Configure logging
@@ -24,19 +37,64 @@ from radon.complexity import cc_visit
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-# Load environment and configure Gemini
+# Load environment
 load_dotenv()
-client = genai.Client(api_key=os.getenv('GEMINI_API_KEY'))
 
 # File extensions and domains
 IMAGE_EXTS = ('.png', '.jpg', '.jpeg', '.gif', '.webp', '.avif', '.svg')
 CODE_EXTS = ('.js', '.jsx', '.ts', '.tsx', '.css', '.html')
-MODERN_IMAGE_EXTS = ('.webp', '.avif')
+JS_EXTS = ('.js', '.jsx', '.ts', '.tsx')
+STATIC_EXTS = JS_EXTS + ('.html', '.py')
+RASTER_IMAGE_EXTS = tuple(e for e in IMAGE_EXTS if e != '.svg')
+# Formats that are already compressed and are counted at their raw size
+PRECOMPRESSED_EXTS = (
+    '.png', '.jpg', '.jpeg', '.gif', '.webp', '.avif',
+    '.woff', '.woff2', '.zip', '.gz', '.br', '.mp4', '.webm', '.mp3'
+)
 THIRD_PARTY_DOMAINS = [
     'googleapis.com', 'gstatic.com', 'facebook.net',
     'analytics.com', 'hotjar.com'
 ]
 
+# Streaming size estimation for metrics
+GZIP_LEVEL = int(os.getenv('METRICS_GZIP_LEVEL', 6))
+COMPRESS_CHUNK_SIZE = 64 * 1024
+BROTLI_QUALITY = int(os.getenv('METRICS_BROTLI_QUALITY', 5))
+ESTIMATE_BROTLI = os.getenv('METRICS_BROTLI', '0') == '1'
+if ESTIMATE_BROTLI and brotli is None:
+    logger.warning("brotli not installed, skipping Brotli estimates")
+    ESTIMATE_BROTLI = False
+
+# Process pool for per-file static rules (0 or 1 keeps everything in-process)
+STATIC_WORKERS = int(os.getenv('STATIC_WORKERS', 0))
+# Below this many uncached files, fork/pickle overhead outweighs the pool
+STATIC_POOL_MIN_FILES = int(os.getenv('STATIC_POOL_MIN_FILES', 200))
+
+# Guideline-check prompts in flight at once (batch sizes are set in sampling.py)
+LLM_CHECK_CONCURRENCY = int(os.getenv('LLM_CHECK_CONCURRENCY', 4))
+
+# Issue enrichment fan-out and budgets
+ENRICH_CHUNK_SIZE = 5
+ENRICH_CONCURRENCY = int(os.getenv('ENRICH_CONCURRENCY', 4))
+# Chunk requests started per second (0 disables the limit)
+ENRICH_RATE_PER_SEC = float(os.getenv('ENRICH_RATE_PER_SEC', 2))
+# Seconds allowed for enrichment before the rest get generic text
+ENRICH_TIME_BUDGET = float(os.getenv('ENRICH_TIME_BUDGET', 45))
+# Gemini enrichment calls allowed per analysis
+ENRICH_MAX_CALLS = int(os.getenv('ENRICH_MAX_CALLS', 10))
+# 'type' explains each issue type once and reuses it for every instance;
+# 'issue' asks Gemini about every (type, file) pair
+ENRICH_MODE = os.getenv('ENRICH_MODE', 'type')
+# Types whose advice depends on the file, enriched per instance even in 'type' mode
+ENRICH_FILE_SPECIFIC_TYPES = {
+    t.strip() for t in os.getenv('ENRICH_FILE_SPECIFIC_TYPES', 'NestedLoop,HighComplexity').split(',')
+    if t.strip()
+}
+ENRICH_TYPES_PER_CALL = int(os.getenv('ENRICH_TYPES_PER_CALL', 10))
+if ENRICH_MODE not in ('type', 'issue'):
+    logger.warning(f"Unknown ENRICH_MODE {ENRICH_MODE}, using 'type'")
+    ENRICH_MODE = 'type'
+
 # Impact weights for sorting (static guidelines)
 IMPACT_WEIGHTS = {
     'Use efficient image formats': 3,
@@ -100,17 +158,22 @@ def cleanup_json_text(text: str) -> str:
 # Single Gemini call
 
 
-def call_gemini(prompt: str, retries: int = 2) -> Any:
+GEMINI_MODEL = 'gemini-2.5-flash-preview-04-17'
+GEMINI_CONFIG = {'temperature': 0.1}
+
+
+async def call_gemini(prompt: str, retries: int = 2) -> Any:
     for i in range(retries):
-        resp = client.models.generate_content(
-            model='gemini-2.5-flash-preview-04-17',
-            contents=prompt,
-            config=types.GenerateContentConfig(temperature=0.1)
-        )
-        text = resp.text
-        logger.debug('Gemini response: %s', text)
+        text = get_cached_response(GEMINI_MODEL, GEMINI_CONFIG, prompt)
+        cached = text is not None
+        if not cached:
+            text = await llm_client.generate(prompt, GEMINI_MODEL, GEMINI_CONFIG)
+        logger.debug('Gemini response (cached=%s): %s', cached, text)
         try:
-            return json.loads(cleanup_json_text(text))
+            result = json.loads(cleanup_json_text(text))
+            if not cached:
+                store_response(GEMINI_MODEL, GEMINI_CONFIG, prompt, text)
+            return result
         except json.JSONDecodeError as e:
             logger.warning('Invalid JSON on attempt %d: %s', i+1, e)
             if i < retries - 1:
@@ -118,240 +181,344 @@ def call_gemini(prompt: str, retries: int = 2) -> Any:
                 continue
             return None
     return None
+# Per-file analysis cache (bump ANALYZER_VERSION when a rule changes)
+
+
+ANALYZER_VERSION = '3'
+analysis_cache = DiskCache(
+    os.getenv('ANALYSIS_CACHE_PATH', 'analysis_cache.db'),
+    int(os.getenv('ANALYSIS_CACHE_MAX_MB', 256)) * 1024 * 1024
+)
+
+
+def cache_key(kind: str, entry: FileEntry) -> str:
+    return f'{kind}:{ANALYZER_VERSION}:{entry.ext}:{entry.git_blob_sha()}'
+
+
+def cached_file_result(index: FileIndex, kind: str, entry: FileEntry,
+                       compute: Callable[[FileEntry], Any]) -> Any:
+    """Return compute(entry), reusing any result stored for the same blob."""
+    key = cache_key(kind, entry)
+    value = analysis_cache.get(key)
+    if value is not None:
+        index.cache_hits += 1
+        return value
+    index.cache_misses += 1
+    value = compute(entry)
+    analysis_cache.set(key, value)
+    return value
+
 # Compute metrics
 
 
-def compute_metrics(root_dir: str) -> Dict[str, Any]:
-    logger.info('Computing metrics in %s', root_dir)
+def compressed_size(entry: FileEntry) -> Dict[str, Any]:
+    """Estimate transfer size by streaming the file through zlib (and brotli)."""
+    sizes = {'gzip': entry.size, 'brotli': None}
+    if entry.ext in PRECOMPRESSED_EXTS:
+        # Already compressed; gzip would not shrink it on the wire
+        if ESTIMATE_BROTLI:
+            sizes['brotli'] = entry.size
+        return sizes
+    try:
+        # wbits=31 emits a gzip container, matching what a server would send
+        gz = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        br = brotli.Compressor(quality=BROTLI_QUALITY) if ESTIMATE_BROTLI else None
+        gz_size = br_size = 0
+        for chunk in entry.iter_chunks(COMPRESS_CHUNK_SIZE):
+            gz_size += len(gz.compress(chunk))
+            if br:
+                br_size += len(br.process(chunk))
+        sizes['gzip'] = gz_size + len(gz.flush())
+        if br:
+            sizes['brotli'] = br_size + len(br.finish())
+    except Exception as e:
+        logger.warning(f"Compressed size estimate failed for {entry.rel_path}: {str(e)}")
+    return sizes
+
+
+def size_settings() -> str:
+    """Part of the size cache keys: estimates change whenever these do."""
+    brotli_quality = BROTLI_QUALITY if ESTIMATE_BROTLI else ''
+    return f'{GZIP_LEVEL}:{brotli_quality}'
+
+
+def file_sizes(index: FileIndex) -> Dict[str, Dict[str, Any]]:
+    """Per-file transfer sizes, the unit that metrics are summed from."""
+    sizes = {}
+    kind = f'size:{size_settings()}'
+    for entry in index:
+        logger.debug('Analyzing file for metrics: %s', entry.path)
+        sizes[entry.rel_path] = cached_file_result(index, kind, entry, compressed_size)
+    return sizes
+
+
+def metrics_from_sizes(sizes: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
     metrics = {
         'total_bytes': 0, 'image_bytes': 0,
         'js_bytes': 0, 'code_bytes': 0,
         'third_party_requests': 0, 'uncompressed_assets': []
     }
-    for dirpath, _, files in os.walk(root_dir):
-        for f in files:
-            path = os.path.join(dirpath, f)
-            logger.debug('Analyzing file for metrics: %s', path)
-            ext = os.path.splitext(f)[1].lower()
-            try:
-                raw = open(path, 'rb').read()
-                size = len(gzip.compress(raw))
-            except Exception:
-                size = os.path.getsize(path)
-            metrics['total_bytes'] += size
-            if ext in IMAGE_EXTS:
-                metrics['image_bytes'] += size
-            if ext in ('.js', '.css'):
-                metrics['js_bytes'] += size
-            if ext in CODE_EXTS:
-                metrics['code_bytes'] += size
-            if ext in ('.js', '.css') and size > 1024:
-                metrics['uncompressed_assets'].append(
-                    os.path.relpath(path, root_dir))
-            if any(domain in path for domain in THIRD_PARTY_DOMAINS):
-                metrics['third_party_requests'] += 1
+    if ESTIMATE_BROTLI:
+        metrics['brotli_bytes'] = 0
+    for rel_path in sorted(sizes):
+        ext = os.path.splitext(rel_path)[1].lower()
+        size = sizes[rel_path]['gzip']
+        metrics['total_bytes'] += size
+        if ESTIMATE_BROTLI:
+            metrics['brotli_bytes'] += sizes[rel_path]['brotli'] or size
+        if ext in IMAGE_EXTS:
+            metrics['image_bytes'] += size
+        if ext in ('.js', '.css'):
+            metrics['js_bytes'] += size
+        if ext in CODE_EXTS:
+            metrics['code_bytes'] += size
+        if ext in ('.js', '.css') and size > 1024:
+            metrics['uncompressed_assets'].append(rel_path)
+        if any(domain in rel_path for domain in THIRD_PARTY_DOMAINS):
+            metrics['third_party_requests'] += 1
+    return metrics
+
+
+def baseline_key(repo_key: str, commit: str) -> str:
+    return f'baseline:{ANALYZER_VERSION}:{size_settings()}:{repo_key}:{commit}'
+
+
+def compute_metrics(index: FileIndex, repo_key: Optional[str] = None,
+                    commit: Optional[str] = None) -> Dict[str, Any]:
+    """Sum metrics over index; with repo_key and commit, also store the
+    per-file sizes as the baseline that later diff runs patch."""
+    logger.info('Computing metrics in %s', index.root_dir)
+    sizes = file_sizes(index)
+    if repo_key and commit:
+        analysis_cache.set(baseline_key(repo_key, commit), sizes)
+    metrics = metrics_from_sizes(sizes)
     logger.info('Metrics computed: %s', metrics)
     return metrics
 
+
+def compute_metrics_incremental(index: FileIndex, changed_paths: Dict[str, str],
+                                repo_key: str, base_commit: str,
+                                head_commit: str) -> Optional[Dict[str, Any]]:
+    """Patch the stored per-file sizes of base_commit with the changed files.
+
+    index only needs to hold the changed files. Returns None when there is
+    no baseline for base_commit, in which case a full run is required.
+    """
+    sizes = analysis_cache.get(baseline_key(repo_key, base_commit))
+    if sizes is None:
+        return None
+    logger.info('Patching metrics baseline with %d changed paths', len(changed_paths))
+    for rel_path, status in changed_paths.items():
+        sizes.pop(rel_path, None)
+    sizes.update(file_sizes(index))
+    analysis_cache.set(baseline_key(repo_key, head_commit), sizes)
+    return metrics_from_sizes(sizes)
+
 # Static guidelines checks
 
 
-def check_guidelines_static(root_dir: str) -> List[Dict[str, Any]]:
-    logger.info('Running static checks in %s', root_dir)
+def check_file_static(path: str, ext: str, content: str) -> List[Dict[str, Any]]:
+    """Rules that only need one file; issues come back without a 'file' key."""
     issues = []
-    html_files = []
-    css_files = []
-    js_files = []
-    image_files = []
-    all_js_code = ""  # For code splitting detection
-
-    # File collection and basic processing
-    for dirpath, dirs, files in os.walk(root_dir):
-        dirs[:] = [d for d in dirs if d not in ('.git', 'node_modules')]
-        for f in files:
-            path = os.path.join(dirpath, f)
-            rel_path = os.path.relpath(path, root_dir)
-            ext = os.path.splitext(f)[1].lower()
 
-            try:
-                with open(path, 'r', encoding='utf-8', errors='ignore') as file:
-                    content = file.read()
-
-                    if ext in IMAGE_EXTS:
-                        image_files.append((path, rel_path))
-                    elif ext == '.html':
-                        html_files.append((rel_path, content))
-                    elif ext == '.css':
-                        css_files.append((rel_path, content))
-                    elif ext in ('.js', '.jsx', '.ts', '.tsx'):
-                        js_files.append((rel_path, content))
-                        all_js_code += content + "\n"
-                    elif ext == '.py':
-                        # Python complexity analysis
-                        try:
-                            for block in cc_visit(content):
-                                if block.complexity > 10:
-                                    issues.append({
-                                        'type': 'HighComplexity',
-                                        'file': rel_path,
-                                        'severity': 'High',
-                                        'weight': 3
-                                    })
-                                    break
-                        except Exception as e:
-                            logger.warning(
-                                f"Complexity analysis failed for {rel_path}: {str(e)}")
+    if ext == '.py':
+        # Python complexity analysis
+        try:
+            for block in cc_visit(content):
+                if block.complexity > 10:
+                    issues.append({'type': 'HighComplexity', 'severity': 'High', 'weight': 3})
+                    break
+        except Exception as e:
+            logger.warning(f"Complexity analysis failed for {path}: {str(e)}")
 
-            except Exception as e:
-                logger.warning(f"Failed to process {rel_path}: {str(e)}")
+    elif ext in JS_EXTS:
+        # Registered AST rules, all in one traversal (rules.py)
+        try:
+            issues.extend(run_js_rules(content))
+        except Exception as e:
+            logger.warning(f"AST analysis failed for {path}: {str(e)}")
 
-    # Image optimization checks
+        # Text compression check
+        if len(content) > 1024:
+            compressed = gzip.compress(content.encode())
+            ratio = len(compressed) / len(content)
+            if ratio > 0.7:
+                issues.append({'type': 'UncompressedJS', 'severity': 'Low', 'weight': 1})
+
+    elif ext == '.html':
+        # Lazy-load and responsive images
+        if '<img' in content:
+            if 'loading="lazy"' not in content:
+                issues.append({'type': 'MissingLazyLoading', 'severity': 'Medium', 'weight': 2})
+            if 'srcset=' not in content:
+                issues.append({'type': 'NonResponsiveImage', 'severity': 'Medium', 'weight': 2})
+
+        # HTTP caching
+        if not re.search(r'<meta[^>]+http-equiv=["\']Cache-Control["\']', content):
+            issues.append({'type': 'MissingCachePolicy', 'severity': 'High', 'weight': 3})
+
+    return issues
+
+
+def _static_worker(task: Tuple[str, str]) -> List[Dict[str, Any]]:
+    """Process-pool entry point: read the file in the worker, not the parent."""
+    path, ext = task
     try:
-        from PIL import Image
-        for path, rel_path in image_files:
-            ext = os.path.splitext(path)[1].lower()
-
-            if ext not in MODERN_IMAGE_EXTS:
-                issues.append({
-                    'type': 'LegacyImageFormat',
-                    'file': rel_path,
-                    'severity': 'High',
-                    'weight': 3
-                })
+        # Same decoding as FileEntry.read_text, so both paths see identical text
+        with open(path, 'rb') as f:
+            content = decode_text(f.read())
+        return check_file_static(path, ext, content)
+    except Exception as e:
+        logger.warning(f"Failed to process {path}: {str(e)}")
+        return []
 
-            try:
-                with Image.open(path) as img:
-                    w, h = img.size
-                    if w * h > 1_000_000:
-                        issues.append({
-                            'type': 'OversizedImage',
-                            'file': rel_path,
-                            'severity': 'Medium',
-                            'weight': 2
-                        })
-            except Exception as e:
-                logger.warning(
-                    f"Image analysis failed for {rel_path}: {str(e)}")
-    except ImportError:
-        logger.warning("Pillow not installed, skipping image checks")
-
-    # JavaScript/TypeScript deep analysis
-    for rel_path, content in js_files:
-        # AST-based nested loop detection
+
+_static_pool = None
+
+
+def _get_static_pool() -> ProcessPoolExecutor:
+    global _static_pool
+    if _static_pool is None:
+        logger.info('Starting static check pool with %d workers', STATIC_WORKERS)
+        # Forking a threaded server can copy held locks into the child; start clean instead
+        method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        _static_pool = ProcessPoolExecutor(max_workers=STATIC_WORKERS,
+                                           mp_context=multiprocessing.get_context(method))
+    return _static_pool
+
+
+def run_static_file_checks(entries: List[FileEntry]) -> List[List[Dict[str, Any]]]:
+    """Evaluate per-file rules, sharded across processes for large batches."""
+    if STATIC_WORKERS > 1 and len(entries) >= STATIC_POOL_MIN_FILES:
+        tasks = [(e.path, e.ext) for e in entries]
+        chunksize = max(1, len(tasks) // (STATIC_WORKERS * 4))
+        # map() yields in submission order, so the merge is deterministic
+        return list(_get_static_pool().map(_static_worker, tasks, chunksize=chunksize))
+
+    results = []
+    for entry in entries:
         try:
-            ast = esprima.parseScript(content, tolerant=True)
+            results.append(check_file_static(entry.path, entry.ext, entry.read_text()))
+        except Exception as e:
+            logger.warning(f"Failed to process {entry.rel_path}: {str(e)}")
+            results.append([])
+    return results
 
-            class LoopVisitor(esprima.NodeVisitor):
-                def __init__(self):
-                    self.loop_depth = 0
-                    self.has_nested = False
 
-                def enter_ForStatement(self, node):
-                    self.loop_depth += 1
-                    if self.loop_depth > 1:
-                        self.has_nested = True
+# Class names can be referenced from markup and from string literals in scripts
+CLASS_SOURCE_EXTS = ('.html', '.htm', '.vue', '.svelte') + JS_EXTS
+STRING_LITERAL_RE = re.compile(r'"(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)*\'|`(?:[^`\\]|\\.)*`')
+CLASS_TOKEN_RE = re.compile(r'-?[_a-zA-Z][\w-]*')
+UNQUOTED_CLASS_RE = re.compile(r'\bclass(?:Name)?=([\w-]+)')
+# A class selector; the first character rules out numbers like 0.5em
+CSS_CLASS_RE = re.compile(r'\.(-?[_a-zA-Z][\w-]*)')
+# Comments, strings, url(...) and declaration blocks hold no selectors
+CSS_NON_SELECTOR_RE = re.compile(
+    r'/\*.*?\*/|"(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\'|\burl\([^)]*\)|\{[^{}]*\}', re.DOTALL)
 
-                def enter_WhileStatement(self, node):
-                    self.loop_depth += 1
-                    if self.loop_depth > 1:
-                        self.has_nested = True
 
-                def leave_ForStatement(self, node):
-                    self.loop_depth -= 1
+def css_class_selectors(content: str) -> List[str]:
+    """Class names used in a stylesheet's selectors, compound ones included."""
+    return CSS_CLASS_RE.findall(CSS_NON_SELECTOR_RE.sub(' ', content))
 
-                def leave_WhileStatement(self, node):
-                    self.loop_depth -= 1
 
-            visitor = LoopVisitor()
-            visitor.visit(ast)
+def class_name_tokens(content: str) -> Set[str]:
+    """Every name-like token in string literals, template literals and class attributes."""
+    tokens = set(UNQUOTED_CLASS_RE.findall(content))
+    for literal in STRING_LITERAL_RE.findall(content):
+        tokens.update(CLASS_TOKEN_RE.findall(literal))
+    return tokens
 
-            if visitor.has_nested:
-                issues.append({
-                    'type': 'NestedLoop',
-                    'file': rel_path,
-                    'severity': 'High',
-                    'weight': 3
-                })
 
+def build_class_index(index: FileIndex) -> Set[str]:
+    """Class names referenced anywhere in index's markup and scripts, built once per scan."""
+    referenced: Set[str] = set()
+    for entry in index.with_ext(*CLASS_SOURCE_EXTS):
+        try:
+            referenced |= class_name_tokens(entry.read_text())
         except Exception as e:
-            logger.warning(f"AST analysis failed for {rel_path}: {str(e)}")
+            logger.warning(f"Failed to index classes in {entry.rel_path}: {str(e)}")
+    return referenced
 
-        # Code splitting detection
-        if not re.search(r"\bimport\(\s*['\"]", content):
-            issues.append({
-                'type': 'NoCodeSplitting',
-                'file': rel_path,
-                'severity': 'Medium',
-                'weight': 2
-            })
 
-    # HTML/JSX optimization checks
-    all_html = ' '.join(content for _, content in html_files)
-    for rel_path, content in html_files:
-        # Lazy-load and responsive images
-        if '<img' in content:
-            if 'loading="lazy"' not in content:
-                issues.append({
-                    'type': 'MissingLazyLoading',
-                    'file': rel_path,
-                    'severity': 'Medium',
-                    'weight': 2
-                })
-            if 'srcset=' not in content:
-                issues.append({
-                    'type': 'NonResponsiveImage',
-                    'file': rel_path,
-                    'severity': 'Medium',
-                    'weight': 2
-                })
+def check_guidelines_static(index: FileIndex, context: Optional[FileIndex] = None,
+                            global_checks: bool = True) -> List[Dict[str, Any]]:
+    """Run static rules on the files in index.
 
-        # HTTP caching
-        if not re.search(r'<meta[^>]+http-equiv=["\']Cache-Control["\']', content):
-            issues.append({
-                'type': 'MissingCachePolicy',
-                'file': rel_path,
-                'severity': 'High',
-                'weight': 3
-            })
+    context is the index cross-file rules read from (e.g. the HTML that CSS
+    selectors are matched against) and defaults to index itself. Repo-wide
+    checks that are not tied to a file can be turned off with global_checks.
+    """
+    logger.info('Running static checks in %s', index.root_dir)
+    issues = []
+    context = context or index
+
+    # Per-file rules, served from the analysis cache when the blob is known
+    entries = index.with_ext(*STATIC_EXTS)
+    per_file: Dict[str, List[Dict[str, Any]]] = {}
+    pending = []
+    for entry in entries:
+        cached = analysis_cache.get(cache_key('static', entry))
+        if cached is None:
+            pending.append(entry)
+        else:
+            per_file[entry.rel_path] = cached
+    index.cache_hits += len(entries) - len(pending)
+    index.cache_misses += len(pending)
+
+    for entry, file_issues in zip(pending, run_static_file_checks(pending)):
+        analysis_cache.set(cache_key('static', entry), file_issues)
+        per_file[entry.rel_path] = file_issues
+
+    for entry in entries:
+        for issue in per_file[entry.rel_path]:
+            issues.append({**issue, 'file': entry.rel_path})
+
+    # Images: header probe and re-encode, cached by content and transcode settings
+    image_kind = f'image:{transcode_settings()}'
+    images = index.with_ext(*RASTER_IMAGE_EXTS)
+    analyses: Dict[str, Optional[Dict[str, Any]]] = {}
+    pending = []
+    for entry in images:
+        key = cache_key(image_kind, entry)
+        cached = analysis_cache.get(key)
+        if cached is None:
+            pending.append(entry)
+        else:
+            analyses[entry.rel_path] = cached.get('analysis')
+    index.cache_hits += len(images) - len(pending)
+    index.cache_misses += len(pending)
+
+    for entry, analysis in zip(pending, analyze_images([e.path for e in pending])):
+        analysis_cache.set(cache_key(image_kind, entry), {'analysis': analysis})
+        analyses[entry.rel_path] = analysis
+
+    for entry in images:
+        for issue in image_issues(entry.ext, analyses[entry.rel_path]):
+            issues.append({**issue, 'file': entry.rel_path})
+
+    # Cross-file rules
+    html_files = [(e.rel_path, e.read_text()) for e in context.with_ext('.html')]
+    all_html = ' '.join(content for _, content in html_files)
 
     # CSS optimization
-    for rel_path, content in css_files:
+    stylesheets = index.with_ext('.css')
+    referenced = build_class_index(context) if stylesheets else set()
+    for entry in stylesheets:
+        content = entry.read_text()
         # Unused CSS detection
-        selectors = re.findall(r'\.([\w-]+)', content)
-        unused = [s for s in selectors if s not in all_html]
+        selectors = css_class_selectors(content)
+        unused = [s for s in selectors if s not in referenced]
         if len(unused) > len(selectors) * 0.2:  # 20% unused threshold
             issues.append({
                 'type': 'UnusedCSS',
-                'file': rel_path,
+                'file': entry.rel_path,
                 'severity': 'Medium',
                 'weight': 2
             })
 
-    # JavaScript optimization
-    for rel_path, content in js_files:
-        # Unused JS detection
-        if 'export ' in content and not re.search(r'import.*from.*[\'"]\./', content):
-            issues.append({
-                'type': 'UnusedJavaScript',
-                'file': rel_path,
-                'severity': 'Medium',
-                'weight': 2
-            })
-
-        # Text compression check
-        if len(content) > 1024:
-            compressed = gzip.compress(content.encode())
-            ratio = len(compressed) / len(content)
-            if ratio > 0.7:
-                issues.append({
-                    'type': 'UncompressedJS',
-                    'file': rel_path,
-                    'severity': 'Low',
-                    'weight': 1
-                })
-
     # Global checks
-    if not re.search(r'<link[^>]+rel=["\']preload["\']', all_html):
+    if global_checks and not re.search(r'<link[^>]+rel=["\']preload["\']', all_html):
         issues.append({
             'type': 'MissingPreload',
             'file': 'global',
@@ -360,70 +527,85 @@ def check_guidelines_static(root_dir: str) -> List[Dict[str, Any]]:
         })
 
     logger.info('Static checks found %d issues', len(issues))
+    logger.debug('JS rule timings: %s', rule_timings())
     return issues
 
 # Batched LLM checks
 
 
-def check_guidelines_llm_batched(root_dir: str) -> List[Dict[str, Any]]:
-    logger.info('Running batched LLM checks in %s', root_dir)
-    file_samples = []
+LLM_CHECK_PROMPT = (
+    "You are a web performance auditor, highly specialized in sustainable web developmet. "
+    "Analyze these code files for energy efficiency issues:\n\n{files}"
+    "\n\nCheck against these guidelines:\n- {guidelines}"
+    "\n\nRespond ONLY with a JSON array: "
+    "[ {{ 'type': string, 'compliant': boolean, 'explanation': string }} ]"
+)
 
-    # Collect first 5 code files with context
-    for dirpath, _, files in os.walk(root_dir):
-        for f in files[:5]:  # Limit to avoid token overflow
-            path = os.path.join(dirpath, f)
-            ext = os.path.splitext(f)[1].lower()
-            if ext not in CODE_EXTS:
-                continue
-            try:
-                with open(path, 'r', encoding='utf-8', errors='ignore') as cf:
-                    content = cf.read(2000)  # First 2000 characters
-                    file_samples.append({
-                        'path': os.path.relpath(path, root_dir),
-                        'content': content
-                    })
-            except Exception:
-                continue
 
-    # Structured prompt with file context
-    prompt = (
-        "You are a web performance auditor, highly specialized in sustainable web developmet. Analyze these code files for energy efficiency issues:\n\n" +
-        "\n\n".join([f"// File: {f['path']}\n{f['content']}" for f in file_samples]) +
-        "\n\nCheck against these guidelines:\n- " +
-        "\n- ".join(LLM_GUIDELINES) +
-        "Respond ONLY with a JSON array: [ { 'type': string, 'compliant': boolean, 'explanation': string } ]"
-    )
-    resp = call_gemini(prompt)
-    results = []
-    if isinstance(resp, list):
+def llm_check_prompt(batch: List[Dict[str, str]]) -> str:
+    files = "\n\n".join(f"// File: {f['path']}\n{f['content']}" for f in batch)
+    return LLM_CHECK_PROMPT.format(files=files, guidelines="\n- ".join(LLM_GUIDELINES))
+
+
+def merge_llm_verdicts(responses: List[Any]) -> List[Dict[str, Any]]:
+    """One issue per guideline that any batch found non-compliant."""
+    results, seen = [], set()
+    for resp in responses:
+        if not isinstance(resp, list):
+            continue
         for r in resp:
-            if not r.get('compliant', True):
+            if not isinstance(r, dict) or not r.get('type') or r.get('compliant', True):
+                continue
+            if r['type'] not in seen:
+                seen.add(r['type'])
                 logger.info('LLM reported non-compliance: %s', r['type'])
                 results.append({'type': r['type'], 'file': None})
+    return results
+
+
+async def check_guidelines_llm_batched(index: FileIndex) -> List[Dict[str, Any]]:
+    """Check LLM_GUIDELINES over token-budgeted batches of the most relevant files."""
+    logger.info('Running batched LLM checks in %s', index.root_dir)
+    overhead = estimate_tokens(len(llm_check_prompt([])))
+    batches = await asyncio.to_thread(pack_samples, index, CODE_EXTS, overhead)
+    logger.info('LLM checks: %d files in %d prompts',
+                sum(len(b) for b in batches), len(batches))
+    semaphore = asyncio.Semaphore(LLM_CHECK_CONCURRENCY)
+
+    async def check(batch):
+        async with semaphore:
+            try:
+                return await call_gemini(llm_check_prompt(batch))
+            except Exception as e:
+                logger.error(f"LLM check batch failed: {str(e)}")
+                return None
+
+    responses = await asyncio.gather(*(check(b) for b in batches))
+    results = merge_llm_verdicts(responses)
     logger.info('LLM checks found %d issues', len(results))
     return results
 
-def keep_alive():
-    """Yield a keep-alive message every 10 seconds."""
-    last_message_time = time.time()
-    while True:
-        current_time = time.time()
-        if current_time - last_message_time >= 10:
-            last_message_time = current_time
-            yield "🔋 Analysis in progress..."
-        else:
-            yield None
+def build_enriched_issue(base: Dict[str, Any], meta: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge Gemini's metadata into an issue, falling back to generic text."""
+    issue = {
+        'type': base['type'],
+        'file': base.get('file'),
+        'severity': meta.get('severity', 'Medium'),
+        'impact': meta.get('impact', 'Contributes to energy consumption'),
+        'solution': meta.get('solution', 'Refer to guidelines'),
+        'weight': IMPACT_WEIGHTS.get(base['type'], 1),
+        'estimated_savings_bytes': base.get('estimated_savings_bytes'),
+    }
+    try:
+        return EnrichedIssue(**issue).model_dump()
+    except ValidationError:
+        return issue
 
-def enrich_all_issues(issues: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+async def enrich_all_issues(issues: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     logger.info('Enriching %d issues via LLM', len(issues))
     if not issues:
         return []
-    
-    # Initialize keep-alive
-    keep_alive_gen = keep_alive()
-    start_time = time.time()
-    
+
     try:
         validated = [BaseIssue(type=i['type'], file=i.get(
             'file')).model_dump() for i in issues]
@@ -440,93 +622,217 @@ def enrich_all_issues(issues: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         "\n\nReturn ONLY JSON array with:  type, file, severity, impact, solution (technical specifics)"
     )
 
-    resp = call_gemini(prompt)
+    resp = await call_gemini(prompt)
     gemini_map = {(g['type'], g.get('file')): g for g in (
         resp if isinstance(resp, list) else [])}
     enriched = []
-    
+    # The time budget is enforced by the caller; every issue here is reported
     for idx, base in enumerate(validated):
-        # Send keep-alive message every 10 seconds
-        if msg := next(keep_alive_gen):
-            logger.info(msg)
-            # If using async context, you'd yield here
-            # For sync context, we'll just log and track time
-            
         key = (base['type'], base.get('file'))
-        meta = gemini_map.get(key, {})
-        issue = {
-            'type': base['type'], 
-            'file': base.get('file'),
-            'severity': meta.get('severity', 'Medium'),
-            'impact': meta.get('impact', 'Contributes to energy consumption'),
-            'solution': meta.get('solution', 'Refer to guidelines'),
-            'weight': IMPACT_WEIGHTS.get(base['type'], 1)
-        }
+        issue = build_enriched_issue(issues[idx], gemini_map.get(key, {}))
         logger.info('Enriched issue: %s => severity=%s',
                     issue['type'], issue['severity'])
-        try:
-            enriched.append(EnrichedIssue(**issue).model_dump())
-        except ValidationError:
-            enriched.append(issue)
-            
-        # Manual timeout after 45 seconds
-        if time.time() - start_time > 45:
-            logger.warning("Enrichment timed out after 45 seconds")
-            break
-            
+        enriched.append(issue)
+
     logger.info('Enrichment completed: %d issues', len(enriched))
     return enriched
 
 
-async def parse(repo_path: str):
+def type_meta_key(issue_type: str) -> str:
+    return f'enrich_type:{ANALYZER_VERSION}:{GEMINI_MODEL}:{issue_type}'
+
+
+def cached_type_metas(types: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Stored type-level enrichment for whichever of types has one."""
+    if llm_cache_bypass.get():
+        return {}
+    metas = {}
+    for issue_type in types:
+        meta = llm_cache.get(type_meta_key(issue_type))
+        if meta is not None:
+            metas[issue_type] = meta
+    return metas
+
+
+async def enrich_issue_types(types: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Ask Gemini for severity, impact and solution per issue type and cache them."""
+    logger.info('Enriching %d issue types via LLM', len(types))
+    prompt = (
+        "You are a web performance auditor, highly specialized in sustainable web developmet. "
+        "For each issue type below, provide sustainability context that applies wherever it occurs:\n"
+        "1. For code issues: Explain CPU impact\n"
+        "2. For images and assets: Explain data transfer costs\n"
+        "3. For accessibility: Explain indirect energy impacts\n\n"
+        "Issue types:\n" + json.dumps(types, indent=2) +
+        "\n\nReturn ONLY JSON array with:  type, severity, impact, solution (technical specifics)"
+    )
+    resp = await call_gemini(prompt)
+    metas = {}
+    for g in resp if isinstance(resp, list) else []:
+        if not isinstance(g, dict) or g.get('type') not in types:
+            continue
+        meta = {k: g[k] for k in ('severity', 'impact', 'solution') if isinstance(g.get(k), str)}
+        metas[g['type']] = meta
+        llm_cache.set(type_meta_key(g['type']), meta)
+    return metas
+
+
+async def enrich_issues_concurrently(issues: List[Dict[str, Any]]):
+    """Enrich issues in concurrent chunks, yielding each chunk as it lands.
+
+    In 'type' mode issues that don't need file-specific advice are explained
+    once per type, from cache when possible, and that text is fanned out to
+    every instance. Chunks past the call budget, or still queued when the
+    time budget runs out, get generic text instead of being dropped. Yields
+    None as a keep-alive when nothing has finished for 10 seconds.
+    """
+    deadline = time.monotonic() + ENRICH_TIME_BUDGET
+    semaphore = asyncio.Semaphore(ENRICH_CONCURRENCY)
+    limiter = RateLimiter(ENRICH_RATE_PER_SEC)
+
+    by_type: Dict[str, List[Dict[str, Any]]] = {}
+    per_issue = []
+    for issue in issues:
+        if ENRICH_MODE == 'type' and issue['type'] not in ENRICH_FILE_SPECIFIC_TYPES:
+            by_type.setdefault(issue['type'], []).append(issue)
+        else:
+            per_issue.append(issue)
+
+    def fan_out(types, metas):
+        return [build_enriched_issue(i, metas.get(t, {})) for t in types for i in by_type[t]]
+
+    async def enrich_types(types):
+        return fan_out(types, await enrich_issue_types(types))
+
+    def fallback(chunk):
+        return [build_enriched_issue(i, {}) for i in chunk]
+
+    async def enrich_chunk(n, request, generic):
+        if n >= ENRICH_MAX_CALLS:
+            return generic()
+        async with semaphore:
+            await limiter.wait()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return generic()
+            try:
+                return await asyncio.wait_for(request(), remaining)
+            except asyncio.TimeoutError:
+                logger.warning('Enrichment budget exhausted; using generic text')
+                return generic()
+            except Exception as e:
+                logger.error(f"Enrichment failed: {str(e)}")
+                return generic()
+
+    cached = cached_type_metas(list(by_type))
+    if cached:
+        yield fan_out(list(cached), cached)
+    missing = [t for t in by_type if t not in cached]
+
+    # Type chunks go first: each covers every instance of its types
+    requests = []
+    for i in range(0, len(missing), ENRICH_TYPES_PER_CALL):
+        types = missing[i:i+ENRICH_TYPES_PER_CALL]
+        requests.append((partial(enrich_types, types), partial(fan_out, types, {})))
+    for i in range(0, len(per_issue), ENRICH_CHUNK_SIZE):
+        chunk = per_issue[i:i+ENRICH_CHUNK_SIZE]
+        requests.append((partial(enrich_all_issues, chunk), partial(fallback, chunk)))
+
+    pending = {asyncio.create_task(enrich_chunk(n, request, generic))
+               for n, (request, generic) in enumerate(requests)}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, timeout=10, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                yield None
+            for task in done:
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def parse(repo_path: str, repo_key: Optional[str] = None, commit: Optional[str] = None,
+                base_commit: Optional[str] = None,
+                changed_paths: Optional[Dict[str, str]] = None):
+    """Analyze repo_path, streaming progress, metrics, issues and the result.
+
+    With base_commit and changed_paths (relative to repo_path, status A/M/D)
+    only the changed files are analyzed and metrics are patched from the
+    baseline stored for base_commit under repo_key.
+    """
     base_dir = repo_path
+    diff_mode = base_commit is not None and changed_paths is not None
 
     try:
+        # Walk the tree once; every stage reads from the same index
+        full_index = None
+        if diff_mode:
+            yield {"type": "progress", "message": f"📂 Indexing {len(changed_paths)} changed files..."}
+            with span('index'):
+                index = await asyncio.to_thread(
+                    scan_repo, base_dir,
+                    only_paths=[p for p, status in changed_paths.items() if status != 'D'])
+        else:
+            yield {"type": "progress", "message": "📂 Indexing repository files..."}
+            with span('index'):
+                index = full_index = await asyncio.to_thread(scan_repo, base_dir)
+
         # Yield metrics progress
         yield {"type": "progress", "message": "📊 Calculating repository metrics..."}
-        metrics = await asyncio.to_thread(compute_metrics, base_dir)
+        metrics = None
+        if diff_mode and repo_key:
+            with span('metrics'):
+                metrics = await asyncio.to_thread(
+                    compute_metrics_incremental, index, changed_paths, repo_key, base_commit, commit)
+        if metrics is None:
+            if full_index is None:
+                yield {"type": "progress", "message": "📂 No stored baseline, indexing repository files..."}
+                with span('index'):
+                    full_index = await asyncio.to_thread(scan_repo, base_dir)
+            with span('metrics'):
+                metrics = await asyncio.to_thread(compute_metrics, full_index, repo_key, commit)
         yield {"type": "metrics", "data": metrics}
 
         # Yield static analysis progress
         yield {"type": "progress", "message": "🔍 Running static analysis..."}
-        static_issues = await asyncio.to_thread(check_guidelines_static, base_dir)
+        if diff_mode and full_index is None and index.with_ext('.css'):
+            # UnusedCSS matches changed stylesheets against all of the HTML
+            with span('index'):
+                full_index = await asyncio.to_thread(scan_repo, base_dir)
+        with span('static'):
+            static_issues = await asyncio.to_thread(
+                check_guidelines_static, index, full_index, not diff_mode)
+        yield {"type": "progress", "message": f"♻️ Analysis cache: {index.cache_hits} hits, {index.cache_misses} misses"}
         for issue in static_issues:
             yield {"type": "issue", "data": issue}
 
         # Yield LLM analysis progress
         yield {"type": "progress", "message": "🧠 Analyzing with AI..."}
-        llm_issues = await asyncio.to_thread(check_guidelines_llm_batched, base_dir)
+        with span('llm_checks'):
+            llm_issues = await check_guidelines_llm_batched(index)
         for issue in llm_issues:
             yield {"type": "issue", "data": issue}
 
         all_issues = static_issues + llm_issues
         yield {"type": "progress", "message": "✨ Enriching findings..."}
-        
-        last_keep_alive = time.time()
-        enriched_issues = []
 
-        all_issues = all_issues[:20] # cap at 20 issues
-        
-        # Process in chunks
-        chunk_size = 5
-        for i in range(0, len(all_issues), chunk_size):
-            chunk = all_issues[i:i+chunk_size]
-            enriched_chunk = await asyncio.to_thread(
-                enrich_all_issues, chunk
-            )
-            enriched_issues.extend(enriched_chunk)
-            
-            # Yield intermediate progress
-            if time.time() - last_keep_alive >= 10:
+        enriched_issues = []
+        async for chunk in timed('enrich', enrich_issues_concurrently(all_issues)):
+            if chunk is None:
                 yield {"type": "progress", "message": "🔋 Analysis in progress..."}
-                last_keep_alive = time.time()
-
+                continue
+            enriched_issues.extend(chunk)
+            yield {"type": "enriched", "data": chunk}
 
         # Sort and yield final results
         sorted_issues = sorted(
             enriched_issues,
             key=lambda x: (-x.get('weight', 0), x.get('severity', 'Medium'))
         )
+        metrics = {**metrics, 'image_savings_bytes': sum(
+            i.get('estimated_savings_bytes') or 0 for i in static_issues)}
         yield {"type": "result", "metrics": metrics, "issues": sorted_issues}
     except Exception as e:
         logger.error(f"Error during analysis: {str(e)}")
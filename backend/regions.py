@@ -0,0 +1,143 @@
+import bisect
+import re
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from esprima.nodes import Node
+from rules import parse_js
+
+JS_EXTS = ('.js', '.jsx', '.ts', '.tsx')
+LOOP_TYPES = {'ForStatement', 'ForInStatement', 'ForOfStatement',
+              'WhileStatement', 'DoWhileStatement'}
+FUNCTION_TYPES = {'FunctionDeclaration', 'FunctionExpression', 'ArrowFunctionExpression'}
+IMG_TAG_RE = re.compile(r'<img\b[^>]*>', re.IGNORECASE)
+HEAD_RE = re.compile(r'<head\b.*?</head\s*>', re.IGNORECASE | re.DOTALL)
+REGION_RE = re.compile(r'<<<REGION (\d+)>>>\n(.*?)\n?<<<END REGION \1>>>', re.DOTALL)
+FENCE_RE = re.compile(r'^\s*```[\w-]*\n(.*?)\n?```\s*$', re.DOTALL)
+
+# Character spans [start, end) and line ranges [first, last) in a file
+Span = Tuple[int, int]
+Lines = Tuple[int, int]
+
+
+def _walk(ast: Node) -> Iterator[Tuple[Node, Tuple[Node, ...]]]:
+    """Every node with its ancestors, outermost first."""
+    stack = [(ast, ())]
+    while stack:
+        node, ancestors = stack.pop()
+        yield node, ancestors
+        inner = ancestors + (node,)
+        for value in node.__dict__.values():
+            if isinstance(value, Node):
+                stack.append((value, inner))
+            elif isinstance(value, list):
+                stack.extend((item, inner) for item in value if isinstance(item, Node))
+
+
+def nested_loop_spans(content: str) -> List[Span]:
+    """Functions enclosing nested loops, or the outer loop at top level."""
+    ast = parse_js(content, ranges=True)
+    if ast is None:
+        return []
+    spans = set()
+    for node, ancestors in _walk(ast):
+        if node.type not in LOOP_TYPES:
+            continue
+        loops = [i for i, a in enumerate(ancestors) if a.type in LOOP_TYPES]
+        if not loops:
+            continue
+        outer = loops[0]
+        functions = [a for a in ancestors[:outer] if a.type in FUNCTION_TYPES]
+        region = functions[-1] if functions else ancestors[outer]
+        spans.add(tuple(region.range))
+    return sorted(spans)
+
+
+def img_spans(attribute: str) -> Callable[[str], List[Span]]:
+    def find(content: str) -> List[Span]:
+        return [m.span() for m in IMG_TAG_RE.finditer(content)
+                if attribute not in m.group(0).lower()]
+    return find
+
+
+def head_spans(content: str) -> List[Span]:
+    match = HEAD_RE.search(content)
+    return [match.span()] if match else []
+
+
+# Issue types whose fix stays inside a locatable region, by file kind. Anything
+# else (unused CSS, code splitting, ...) needs the whole file.
+REGION_FINDERS: Dict[str, Dict[str, Callable[[str], List[Span]]]] = {
+    'js': {'NestedLoop': nested_loop_spans},
+    'html': {
+        'MissingLazyLoading': img_spans('loading='),
+        'NonResponsiveImage': img_spans('srcset='),
+        'MissingCachePolicy': head_spans,
+    },
+}
+
+
+def _kind(ext: str) -> str:
+    return 'js' if ext in JS_EXTS else ext.lstrip('.')
+
+
+def locate_regions(content: str, ext: str, issue_types: List[str]) -> Optional[List[Lines]]:
+    """Merged line ranges covering every issue, or None if any can't be located."""
+    finders = REGION_FINDERS.get(_kind(ext), {})
+    spans: List[Span] = []
+    for issue_type in issue_types:
+        found = finders[issue_type](content) if issue_type in finders else []
+        if not found:
+            return None
+        spans.extend(found)
+
+    line_starts = [0] + [m.end() for m in re.finditer('\n', content)]
+    lines = sorted((bisect.bisect_right(line_starts, start) - 1,
+                    bisect.bisect_right(line_starts, max(start, end - 1)))
+                   for start, end in spans)
+    merged: List[Lines] = []
+    for first, last in lines:
+        if merged and first <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], last))
+        else:
+            merged.append((first, last))
+    return merged
+
+
+def split_lines(content: str) -> List[str]:
+    """Lines with their endings, split on \\n only to match locate_regions."""
+    parts = content.split('\n')
+    return [p + '\n' for p in parts[:-1]] + ([parts[-1]] if parts[-1] else [])
+
+
+def parse_regions(text: str) -> Dict[int, str]:
+    """Replacement text per region number from a model response."""
+    regions = {}
+    for n, body in REGION_RE.findall(text):
+        fenced = FENCE_RE.match(body)
+        regions[int(n)] = fenced.group(1) if fenced else body
+    return regions
+
+
+def splice_regions(content: str, regions: List[Lines], replacements: Dict[int, str]) -> str:
+    """content with each numbered region's lines swapped for its replacement."""
+    lines = split_lines(content)
+    out, pos = [], 0
+    for n, (first, last) in enumerate(regions, 1):
+        out.extend(lines[pos:first])
+        replacement = replacements[n]
+        if replacement and not replacement.endswith('\n') and lines[last - 1].endswith('\n'):
+            replacement += '\n'
+        out.append(replacement)
+        pos = last
+    out.extend(lines[pos:])
+    return ''.join(out)
+
+
+def still_parses(ext: str, original: str, updated: str) -> bool:
+    """False if the rewrite broke a file that used to parse."""
+    if _kind(ext) == 'js':
+        return parse_js(updated) is not None or parse_js(original) is None
+    if ext == '.html':
+        # Regions sit inside the document; its skeleton must survive the splice
+        skeleton = re.compile(r'</?(?:html|head|body)\b', re.IGNORECASE)
+        return len(skeleton.findall(updated)) == len(skeleton.findall(original))
+    return True
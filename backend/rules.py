@@ -0,0 +1,219 @@
+import logging
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+import esprima
+from esprima.nodes import Node
+
+logger = logging.getLogger(__name__)
+
+
+class Rule:
+    """A per-file JS/TS rule.
+
+    Subclasses subscribe to node types by defining enter_<Type> and/or
+    leave_<Type>; every registered rule shares one traversal of the file's
+    AST. finish() reports whether the rule fired. Files esprima cannot parse
+    (TypeScript, mostly) go to fallback(), which sees only the source text.
+    """
+
+    type = ''
+    severity = 'Medium'
+    weight = 2
+
+    def finish(self) -> bool:
+        return False
+
+    def fallback(self, content: str) -> bool:
+        return False
+
+    def issue(self) -> Dict[str, Any]:
+        return {'type': self.type, 'severity': self.severity, 'weight': self.weight}
+
+
+RULES: List[Type[Rule]] = []
+
+
+def register(cls: Type[Rule]) -> Type[Rule]:
+    RULES.append(cls)
+    return cls
+
+
+@register
+class NestedLoopRule(Rule):
+    type = 'NestedLoop'
+    severity = 'High'
+    weight = 3
+
+    def __init__(self):
+        self.depth = 0
+        self.nested = False
+
+    def _enter_loop(self, node):
+        self.depth += 1
+        if self.depth > 1:
+            self.nested = True
+
+    def _leave_loop(self, node):
+        self.depth -= 1
+
+    enter_ForStatement = enter_ForInStatement = enter_ForOfStatement = _enter_loop
+    enter_WhileStatement = enter_DoWhileStatement = _enter_loop
+    leave_ForStatement = leave_ForInStatement = leave_ForOfStatement = _leave_loop
+    leave_WhileStatement = leave_DoWhileStatement = _leave_loop
+
+    def finish(self) -> bool:
+        return self.nested
+
+    def fallback(self, content: str) -> bool:
+        # Track which open braces belong to loop bodies
+        stack: List[bool] = []
+        pending_loop = False
+        for token in re.findall(r'\b(?:for|while)\s*\(|[{}]', content):
+            if token == '{':
+                stack.append(pending_loop)
+                pending_loop = False
+            elif token == '}':
+                if stack:
+                    stack.pop()
+            else:
+                if any(stack):
+                    return True
+                pending_loop = True
+        return False
+
+
+@register
+class NoCodeSplittingRule(Rule):
+    type = 'NoCodeSplitting'
+
+    def __init__(self):
+        self.dynamic_import = False
+
+    def enter_Import(self, node):
+        # esprima parses import('x') as a CallExpression whose callee is Import
+        self.dynamic_import = True
+
+    def finish(self) -> bool:
+        return not self.dynamic_import
+
+    def fallback(self, content: str) -> bool:
+        return not re.search(r"\bimport\(\s*['\"]", content)
+
+
+@register
+class UnusedJavaScriptRule(Rule):
+    type = 'UnusedJavaScript'
+
+    def __init__(self):
+        self.exports = False
+        self.relative_import = False
+
+    def _enter_export(self, node):
+        self.exports = True
+
+    enter_ExportNamedDeclaration = enter_ExportDefaultDeclaration = _enter_export
+    enter_ExportAllDeclaration = _enter_export
+
+    def enter_ImportDeclaration(self, node):
+        if node.source.value.startswith('.'):
+            self.relative_import = True
+
+    def finish(self) -> bool:
+        return self.exports and not self.relative_import
+
+    def fallback(self, content: str) -> bool:
+        return 'export ' in content and not re.search(r'import.*from.*[\'"]\./', content)
+
+
+# Seconds and invocations spent in each rule, across all files in this process
+_timings: Dict[str, List[float]] = {}
+_timings_lock = threading.Lock()
+
+
+def rule_timings() -> Dict[str, Dict[str, float]]:
+    with _timings_lock:
+        return {name: {'seconds': t[0], 'files': t[1]} for name, t in _timings.items()}
+
+
+def _record(elapsed: Dict[str, float]):
+    with _timings_lock:
+        for name, seconds in elapsed.items():
+            totals = _timings.setdefault(name, [0.0, 0])
+            totals[0] += seconds
+            totals[1] += 1
+
+
+def parse_js(content: str, ranges: bool = False) -> Optional[Node]:
+    """Module/JSX-aware parse, retrying as a script; None if esprima can't read it.
+
+    With ranges, every node carries its [start, end) character offsets.
+    """
+    for parse in (esprima.parseModule, esprima.parseScript):
+        try:
+            return parse(content, {'jsx': True, 'tolerant': True, 'range': ranges})
+        except Exception:
+            continue
+    return None
+
+
+def run_js_rules(content: str, rules: Optional[List[Type[Rule]]] = None) -> List[Dict[str, Any]]:
+    """Evaluate every registered rule over one traversal of content's AST."""
+    instances = [cls() for cls in (RULES if rules is None else rules)]
+    elapsed = {rule.type: 0.0 for rule in instances}
+    ast = parse_js(content)
+
+    if ast is None:
+        fired = []
+        for rule in instances:
+            start = time.perf_counter()
+            if rule.fallback(content):
+                fired.append(rule)
+            elapsed[rule.type] += time.perf_counter() - start
+        _record(elapsed)
+        return [rule.issue() for rule in fired]
+
+    # Dispatch tables: node type -> [(rule name, handler)]
+    enter: Dict[str, List[Tuple[str, Callable]]] = {}
+    leave: Dict[str, List[Tuple[str, Callable]]] = {}
+    for rule in instances:
+        for attr in dir(rule):
+            if attr.startswith('enter_') or attr.startswith('leave_'):
+                table = enter if attr.startswith('enter_') else leave
+                table.setdefault(attr[6:], []).append((rule.type, getattr(rule, attr)))
+
+    def dispatch(handlers: List[Tuple[str, Callable]], node: Node):
+        for name, handler in handlers:
+            start = time.perf_counter()
+            handler(node)
+            elapsed[name] += time.perf_counter() - start
+
+    # Iterative walk; a leave marker is only pushed for types someone listens to
+    stack: List[Tuple[Node, bool]] = [(ast, False)]
+    push = stack.append
+    while stack:
+        node, leaving = stack.pop()
+        if leaving:
+            dispatch(leave[node.type], node)
+            continue
+        if node.type in enter:
+            dispatch(enter[node.type], node)
+        if node.type in leave:
+            push((node, True))
+        for value in node.__dict__.values():
+            if isinstance(value, Node):
+                push((value, False))
+            elif isinstance(value, list):
+                for item in value:
+                    if isinstance(item, Node):
+                        push((item, False))
+
+    issues = []
+    for rule in instances:
+        start = time.perf_counter()
+        if rule.finish():
+            issues.append(rule.issue())
+        elapsed[rule.type] += time.perf_counter() - start
+    _record(elapsed)
+    return issues
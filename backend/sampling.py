@@ -0,0 +1,120 @@
+import math
+import os
+import posixpath
+import re
+from typing import Dict, Iterable, List, Set
+from scanner import FileEntry, FileIndex
+
+# Prompt size limits for the LLM guideline checks, in estimated tokens
+LLM_PROMPT_TOKENS = int(os.getenv('LLM_PROMPT_TOKENS', 12000))
+# Prompts per analysis; together they bound how much of the repo the LLM sees
+LLM_MAX_PROMPTS = int(os.getenv('LLM_MAX_PROMPTS', 4))
+# Longer files are cut to their head so one file cannot fill a prompt
+LLM_FILE_MAX_TOKENS = int(os.getenv('LLM_FILE_MAX_TOKENS', 3000))
+
+# Rough ratio for code; good enough to stay under the model's context limit
+CHARS_PER_TOKEN = 4
+
+ENTRY_STEMS = {'index', 'main', 'app', '_app', '_document', 'layout', 'page'}
+LOW_VALUE_RE = re.compile(
+    r'(^|/)(__tests__|__mocks__|tests?|e2e|stories|vendor|third_party)/'
+    r'|\.(test|spec|stories|min)\.[^/]+$'
+    r'|(^|/)[^/]+\.config\.[^/]+$')
+ASSET_REF_RE = re.compile(r'''\b(?:src|href)\s*=\s*["']([^"'#?]+)''', re.IGNORECASE)
+TRUNCATED_MARKER = '\n/* ... truncated ... */'
+
+
+def estimate_tokens(chars: int) -> int:
+    return math.ceil(chars / CHARS_PER_TOKEN)
+
+
+def html_references(index: FileIndex) -> Set[str]:
+    """Repo-relative paths of local scripts and styles loaded by HTML pages."""
+    referenced = set()
+    for entry in index.with_ext('.html', '.htm'):
+        try:
+            content = entry.read_text()
+        except OSError:
+            continue
+        base = posixpath.dirname(entry.rel_path)
+        for ref in ASSET_REF_RE.findall(content):
+            if '//' in ref or ref.startswith(('data:', 'mailto:')):
+                continue
+            if ref.startswith('/'):
+                # Root-relative: the repo root in Vite-style projects, else public/
+                candidates = [ref.lstrip('/'), 'public' + ref]
+            else:
+                candidates = [posixpath.join(base, ref)]
+            referenced.update(posixpath.normpath(c) for c in candidates)
+    return referenced
+
+
+def file_score(entry: FileEntry, referenced: Set[str]) -> float:
+    """Higher for files more likely to matter to what users download and run."""
+    rel_path = entry.rel_path.replace(os.sep, '/')
+    stem = posixpath.basename(rel_path).split('.')[0].lower()
+    score = math.log2(entry.size + 1)
+    if rel_path in referenced:
+        score += 6
+    if stem in ENTRY_STEMS:
+        score += 4
+    if LOW_VALUE_RE.search(rel_path):
+        score -= 10
+    return score - 0.5 * rel_path.count('/')
+
+
+def rank_files(index: FileIndex, exts: Iterable[str]) -> List[FileEntry]:
+    """Non-empty files with the given extensions, most relevant first."""
+    referenced = html_references(index)
+    entries = [e for e in index.with_ext(*exts) if e.size > 0]
+    return sorted(entries, key=lambda e: (-file_score(e, referenced), e.rel_path))
+
+
+def _sample(entry: FileEntry, max_chars: int) -> str:
+    content = entry.read_text()
+    if len(content) > max_chars:
+        cut = content.rfind('\n', 0, max_chars)
+        content = content[:cut if cut > 0 else max_chars] + TRUNCATED_MARKER
+    return content
+
+
+def pack_samples(index: FileIndex, exts: Iterable[str], overhead_tokens: int = 0,
+                 prompt_tokens: int = LLM_PROMPT_TOKENS,
+                 max_prompts: int = LLM_MAX_PROMPTS,
+                 file_max_tokens: int = LLM_FILE_MAX_TOKENS) -> List[List[Dict[str, str]]]:
+    """Pack ranked file samples into at most max_prompts batches.
+
+    Each batch's estimated tokens, plus overhead_tokens for the instructions,
+    stay within prompt_tokens. Files are placed in rank order into the first
+    batch with room, so the budget goes to the most relevant files and only
+    the chosen ones are read. Sizes are estimated from byte counts, which
+    never undercount the decoded text.
+    """
+    budget = prompt_tokens - overhead_tokens
+    file_max_tokens = min(file_max_tokens, budget)
+    if budget <= 0 or max_prompts <= 0:
+        return []
+    batches: List[List[Dict[str, str]]] = []
+    room: List[int] = []
+    for entry in rank_files(index, exts):
+        # Header plus the blank line that separates files in the prompt
+        header = f'// File: {entry.rel_path}\n\n\n'
+        body_chars = min(entry.size, file_max_tokens * CHARS_PER_TOKEN
+                         - len(header) - len(TRUNCATED_MARKER))
+        if body_chars <= 0:
+            continue
+        cost = estimate_tokens(len(header) + body_chars + len(TRUNCATED_MARKER))
+        slot = next((i for i, r in enumerate(room) if r >= cost), None)
+        if slot is None:
+            if len(batches) == max_prompts:
+                continue
+            batches.append([])
+            room.append(budget)
+            slot = len(batches) - 1
+        try:
+            content = _sample(entry, body_chars)
+        except OSError:
+            continue
+        batches[slot].append({'path': entry.rel_path, 'content': content})
+        room[slot] -= cost
+    return [b for b in batches if b]
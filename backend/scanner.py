@@ -0,0 +1,266 @@
+import fnmatch
+import hashlib
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from git import Git, GitError
+
+logger = logging.getLogger(__name__)
+
+# Directories that are never worth scanning
+DEFAULT_IGNORE_DIRS = ('.git', 'node_modules')
+# Extra comma-separated directory names or glob patterns to ignore
+EXTRA_IGNORE = [p.strip() for p in os.getenv('SCAN_IGNORE', '').split(',')
+                if p.strip()]
+# Honour .gitignore files found while walking (set to 0 to disable)
+RESPECT_GITIGNORE = os.getenv('SCAN_RESPECT_GITIGNORE', '1') != '0'
+# Files up to this size keep their bytes in memory once read
+MAX_CACHED_BYTES = int(os.getenv('SCAN_MAX_CACHED_BYTES', 1024 * 1024))
+
+
+class GitIgnore:
+    """Minimal .gitignore matcher (globs, negation, anchors, dir-only)."""
+
+    def __init__(self, base: str = ''):
+        # base is the directory (relative to the scan root) holding the file
+        self.base = base
+        self.rules: List[Tuple[str, bool, bool, bool]] = []
+
+    @classmethod
+    def from_file(cls, path: str, base: str = '') -> 'GitIgnore':
+        ignore = cls(base)
+        try:
+            with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+                ignore.add_patterns(f.read().splitlines())
+        except OSError as e:
+            logger.warning(f"Could not read {path}: {str(e)}")
+        return ignore
+
+    def add_patterns(self, lines: Iterable[str]):
+        for line in lines:
+            line = line.rstrip()
+            if not line or line.startswith('#'):
+                continue
+            negate = line.startswith('!')
+            if negate:
+                line = line[1:]
+            dir_only = line.endswith('/')
+            line = line.rstrip('/')
+            anchored = '/' in line
+            line = line.lstrip('/')
+            if line:
+                self.rules.append((line, negate, dir_only, anchored))
+
+    def match(self, rel_path: str, is_dir: bool) -> Optional[bool]:
+        """Return True/False if a rule decides rel_path, else None."""
+        if self.base:
+            if not rel_path.startswith(self.base + '/'):
+                return None
+            rel_path = rel_path[len(self.base) + 1:]
+        decision = None
+        name = rel_path.rsplit('/', 1)[-1]
+        for pattern, negate, dir_only, anchored in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if anchored:
+                hit = _glob_match(rel_path, pattern)
+            else:
+                hit = fnmatch.fnmatchcase(name, pattern)
+            if hit:
+                decision = not negate
+        return decision
+
+
+def _glob_match(path: str, pattern: str) -> bool:
+    if '**' not in pattern:
+        return (fnmatch.fnmatchcase(path, pattern)
+                and path.count('/') == pattern.count('/'))
+    # '**' may span any number of directories, including none
+    return (fnmatch.fnmatchcase(path, pattern.replace('**/', '*'))
+            or fnmatch.fnmatchcase(path, pattern.replace('**', '*')))
+
+
+def decode_text(data: bytes) -> str:
+    """File bytes as analysed text: UTF-8, undecodable bytes dropped, line endings kept."""
+    return data.decode('utf-8', errors='ignore')
+
+
+@dataclass
+class FileEntry:
+    path: str
+    rel_path: str
+    size: int
+    ext: str
+    blob_sha: Optional[str] = None
+    _data: Optional[bytes] = field(default=None, repr=False)
+
+    def read_bytes(self) -> bytes:
+        if self._data is not None:
+            return self._data
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        if len(data) <= MAX_CACHED_BYTES:
+            self._data = data
+        return data
+
+    def read_text(self) -> str:
+        return decode_text(self.read_bytes())
+
+    def iter_chunks(self, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        """Yield the contents in fixed-size chunks without caching them."""
+        if self._data is not None:
+            for start in range(0, len(self._data), chunk_size):
+                yield self._data[start:start + chunk_size]
+            return
+        with open(self.path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                yield chunk
+
+    def git_blob_sha(self) -> str:
+        """Git object id of the file contents, hashed locally if git had none."""
+        if self.blob_sha is None:
+            digest = hashlib.sha1(b'blob %d\0' % self.size)
+            for chunk in self.iter_chunks(1024 * 1024):
+                digest.update(chunk)
+            self.blob_sha = digest.hexdigest()
+        return self.blob_sha
+
+
+@dataclass
+class FileIndex:
+    root_dir: str
+    files: List[FileEntry] = field(default_factory=list)
+    by_ext: Dict[str, List[FileEntry]] = field(default_factory=dict)
+    cache_hits: int = 0
+    cache_misses: int = 0
+
+    def add(self, entry: FileEntry):
+        self.files.append(entry)
+        self.by_ext.setdefault(entry.ext, []).append(entry)
+
+    def with_ext(self, *exts: str) -> List[FileEntry]:
+        """Files with any of exts, grouped by extension in the order given."""
+        return [e for ext in dict.fromkeys(exts) for e in self.by_ext.get(ext, ())]
+
+    def __iter__(self) -> Iterator[FileEntry]:
+        return iter(self.files)
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+
+def _is_ignored(rel_path: str, is_dir: bool, ignores: List[GitIgnore]) -> bool:
+    name = rel_path.rsplit('/', 1)[-1]
+    if is_dir and name in DEFAULT_IGNORE_DIRS:
+        return True
+    if any(fnmatch.fnmatchcase(name, p) for p in EXTRA_IGNORE):
+        return True
+    decision = False
+    for ignore in ignores:
+        hit = ignore.match(rel_path, is_dir)
+        if hit is not None:
+            decision = hit
+    return decision
+
+
+def _git_blob_shas(root_dir: str) -> Dict[str, str]:
+    """Map paths (relative to root_dir) of clean tracked files to blob ids."""
+    try:
+        git = Git(root_dir)
+        staged = git.ls_files('-s', '-z')
+        modified = set(git.ls_files('-m', '-z').split('\0'))
+    except (GitError, OSError):
+        return {}
+    shas = {}
+    for line in staged.split('\0'):
+        if not line:
+            continue
+        meta, rel_path = line.split('\t', 1)
+        if rel_path not in modified:
+            shas[rel_path] = meta.split()[1]
+    return shas
+
+
+def _make_entry(root_dir: str, rel_path: str, blob_shas: Dict[str, str]) -> Optional[FileEntry]:
+    path = os.path.join(root_dir, rel_path)
+    try:
+        size = os.path.getsize(path)
+    except OSError as e:
+        logger.warning(f"Failed to stat {rel_path}: {str(e)}")
+        return None
+    return FileEntry(
+        path=path,
+        rel_path=os.path.relpath(path, root_dir),
+        size=size,
+        ext=os.path.splitext(rel_path)[1].lower(),
+        blob_sha=blob_shas.get(rel_path),
+    )
+
+
+def scan_repo(root_dir: str, respect_gitignore: bool = RESPECT_GITIGNORE,
+              only_paths: Optional[Iterable[str]] = None) -> FileIndex:
+    """Walk root_dir once and return an index of every non-ignored file.
+
+    With only_paths (relative, '/'-separated) the walk is skipped and just
+    those files are indexed, which keeps diff-scoped runs at diff scale.
+    """
+    logger.info('Scanning repository in %s', root_dir)
+    index = FileIndex(root_dir=root_dir)
+    ignores: List[GitIgnore] = []
+    # Tracked files get their object id from git for free
+    blob_shas = _git_blob_shas(root_dir)
+
+    if only_paths is not None:
+        # Apply the same ignore rules as the walk, or diff runs would see
+        # vendored and built files that full scans never count
+        gitignores: Dict[str, Optional[GitIgnore]] = {}
+
+        def dir_ignores(rel_dir: str) -> List[GitIgnore]:
+            if rel_dir not in gitignores:
+                path = os.path.join(root_dir, rel_dir, '.gitignore')
+                gitignores[rel_dir] = (GitIgnore.from_file(path, rel_dir)
+                                       if respect_gitignore and os.path.isfile(path) else None)
+            return [gitignores[rel_dir]] if gitignores[rel_dir] else []
+
+        def ignored(rel_path: str) -> bool:
+            parts = rel_path.split('/')
+            ignores = dir_ignores('')
+            for depth in range(1, len(parts)):
+                rel_dir = '/'.join(parts[:depth])
+                if _is_ignored(rel_dir, True, ignores):
+                    return True
+                ignores = ignores + dir_ignores(rel_dir)
+            return _is_ignored(rel_path, False, ignores)
+
+        for rel_path in sorted(only_paths):
+            if ignored(rel_path):
+                continue
+            if os.path.isfile(os.path.join(root_dir, rel_path)):
+                entry = _make_entry(root_dir, rel_path, blob_shas)
+                if entry:
+                    index.add(entry)
+        logger.info('Indexed %d changed files', len(index))
+        return index
+
+    for dirpath, dirs, files in os.walk(root_dir):
+        rel_dir = os.path.relpath(dirpath, root_dir).replace(os.sep, '/')
+        rel_dir = '' if rel_dir == '.' else rel_dir
+        if respect_gitignore and '.gitignore' in files:
+            ignores.append(GitIgnore.from_file(
+                os.path.join(dirpath, '.gitignore'), rel_dir))
+
+        def rel(name: str) -> str:
+            return f'{rel_dir}/{name}' if rel_dir else name
+
+        dirs[:] = sorted(d for d in dirs if not _is_ignored(rel(d), True, ignores))
+        for f in sorted(files):
+            rel_path = rel(f)
+            if _is_ignored(rel_path, False, ignores):
+                continue
+            entry = _make_entry(root_dir, rel_path, blob_shas)
+            if entry:
+                index.add(entry)
+
+    logger.info('Indexed %d files', len(index))
+    return index
@@ -11,4 +11,5 @@ class GeminiIssue(BaseModel):
     solution: str
 
 class EnrichedIssue(BaseIssue, GeminiIssue):
-    weight: int
\ No newline at end of file
+    weight: int
+    estimated_savings_bytes: Optional[int] = None
\ No newline at end of file
@@ -1,36 +1,64 @@
+import hashlib
 import os
 import shutil
-import sqlite3
 import tempfile
+import time
+import zlib
 from typing import Any, Dict, List
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import asyncio
-from git import Repo, GitCommandError
-from google import genai
+from git import GitCommandError
 import json
 import re
 from pathlib import Path
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from pydantic import BaseModel
+from cache import DiskCache
 from estimator import estimate
+from events import sse_event, unified_diff
 from github_auth import create_and_push_branch
-from parser import parse
-
-client = genai.Client(api_key=os.getenv('GEMINI_API_KEY'))
-
-# Initialize SQLite database
-conn = sqlite3.connect('files.db')
-c = conn.cursor()
-c.execute('''
-    CREATE TABLE IF NOT EXISTS files (
-        file_path TEXT PRIMARY KEY,
-        content TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-''')
-conn.commit()
-conn.close()
+from jobs import JobManager, sse_stream
+from llm_cache import get_cached_response, llm_cache, llm_cache_bypass, store_response
+from llm_client import llm_client
+from mirror_pool import MirrorPool, normalize_repo_url, resolve_commit, valid_ref
+from parser import analysis_cache, parse
+from regions import locate_regions, parse_regions, splice_regions, split_lines, still_parses
+from storage import file_store, normalize_file_path, valid_session_id
+from telemetry import register_caches, span, start_timings, timed
+
+file_store.prune()
+
+mirror_pool = MirrorPool()
+job_manager = JobManager()
+# Finished analyses of the same repo and commit are shared for this many seconds
+ANALYSIS_RESULT_TTL = float(os.getenv('ANALYSIS_RESULT_TTL', 600))
+
+# Code generation fan-out: at most this many Gemini calls in flight per analysis
+CODEGEN_CONCURRENCY = int(os.getenv('CODEGEN_CONCURRENCY', 4))
+# Seconds before a file's generation is abandoned, region attempt and fallback together
+CODEGEN_TIMEOUT = float(os.getenv('CODEGEN_TIMEOUT', 60))
+CODEGEN_MODEL = "gemini-2.0-flash-lite"
+# Files this long only send the regions around their issues when all can be located
+CODEGEN_REGION_MIN_LINES = int(os.getenv('CODEGEN_REGION_MIN_LINES', 200))
+CODEGEN_REGIONS = os.getenv('CODEGEN_REGIONS', '1') == '1'
+# Read-only lines shown on each side of a region
+CODEGEN_REGION_CONTEXT = int(os.getenv('CODEGEN_REGION_CONTEXT', 5))
+
+# Upper bounds for one /save-files request, after decompression
+SAVE_MAX_BYTES = int(os.getenv('SAVE_MAX_BYTES', 32 * 1024 * 1024))
+SAVE_MAX_FILES = int(os.getenv('SAVE_MAX_FILES', 1000))
+
+# With the default "diff" payload, code events carry a unified diff and the
+# original file is served once from /originals/{blob_sha}
+CODE_PAYLOADS = ("diff", "full")
+ORIGINALS_CACHE_PATH = os.getenv('ORIGINALS_CACHE_PATH', 'originals_cache.db')
+ORIGINALS_CACHE_MAX_MB = int(os.getenv('ORIGINALS_CACHE_MAX_MB', 256))
+originals = DiskCache(ORIGINALS_CACHE_PATH, ORIGINALS_CACHE_MAX_MB * 1024 * 1024,
+                      ttl=float(os.getenv('ORIGINALS_CACHE_TTL', 24 * 3600)))
+
+register_caches(analysis=analysis_cache, llm=llm_cache, originals=originals)
 
 app = FastAPI()
 
@@ -62,10 +90,28 @@ def extract_codeblock_content(text):
     matches = re.findall(pattern, text, re.DOTALL)
     return matches[0].strip() if matches else text
 
-async def generate_optimized_code(original_content: str, issue: Dict) -> str | None:
+async def generate_codegen_text(prompt: str) -> str | None:
+    cached = get_cached_response(CODEGEN_MODEL, {}, prompt)
+    if cached is not None:
+        return cached
+    try:
+        text = await llm_client.generate(prompt, CODEGEN_MODEL)
+        print(text)
+        if text:
+            store_response(CODEGEN_MODEL, {}, prompt, text)
+        return text
+    except Exception as e:
+        print(f"Error generating optimized code: {str(e)}")
+        return None
+
+def format_issues(issues: List[Dict]) -> str:
+    return "\n    ".join(f"{n}. {issue}" for n, issue in enumerate(issues, 1))
+
+async def generate_optimized_code(original_content: str, issues: List[Dict]) -> str | None:
     prompt = f"""
     Optimize this code based on sustainability suggestions:
-    Issues Dictionary For Given Code: {issue}
+    Issues Dictionary For Given Code (address all of them in one rewrite):
+    {format_issues(issues)}
     
     Original code:
     {original_content}
@@ -73,76 +119,161 @@ async def generate_optimized_code(original_content: str, issue: Dict) -> str | N
     Return the entire file that includes the optimized code without explanations.
     Preserve functionality while implementing improvements.
     """
+    return await generate_codegen_text(prompt)
+
+async def generate_region_code(content: str, ext: str, issues: List[Dict],
+                               regions: List[tuple]) -> str | None:
+    """Rewrite only the given line ranges; None if the reply can't be spliced cleanly."""
+    lines = split_lines(content)
+    sections = []
+    for n, (first, last) in enumerate(regions, 1):
+        before = ''.join(lines[max(0, first - CODEGEN_REGION_CONTEXT):first])
+        after = ''.join(lines[last:last + CODEGEN_REGION_CONTEXT])
+        sections.append(
+            f"Lines {first + 1}-{last}:\n"
+            f"Context before (do not return):\n{before}"
+            f"<<<REGION {n}>>>\n{''.join(lines[first:last])}<<<END REGION {n}>>>\n"
+            f"Context after (do not return):\n{after}")
+    prompt = f"""
+    Optimize this code based on sustainability suggestions:
+    Issues Dictionary For Given Code (address all of them):
+    {format_issues(issues)}
+    
+    Only the regions below need to change:
+    
+{chr(10).join(sections)}
+    
+    Return a replacement for every region, each wrapped in its own <<<REGION n>>> and
+    <<<END REGION n>>> marker lines, and nothing else.
+    Preserve functionality while implementing improvements.
+    """
+    text = await generate_codegen_text(prompt)
+    if not text:
+        return None
+    replacements = parse_regions(text)
+    if set(replacements) != set(range(1, len(regions) + 1)):
+        print(f"Region reply covered {sorted(replacements)} of {len(regions)} regions")
+        return None
+    optimized = splice_regions(content, regions, replacements)
+    if not still_parses(ext, content, optimized):
+        print("Spliced regions no longer parse")
+        return None
+    return optimized
+
+async def generate_file_code(filename: str, issue_ids: List[int], issues: List[Dict],
+                             repo_path: str, frontend_dir: str,
+                             semaphore: asyncio.Semaphore, payload: str = "diff") -> List[str]:
+    """Generate one optimized file covering all of its issues; return its SSE messages."""
     try:
-        response = await asyncio.to_thread(
-            client.models.generate_content,
-            model="gemini-2.0-flash-lite",
-            contents=prompt
-        )
-        print(response.text)
-        return response.text
+        full_path = os.path.join(repo_path, frontend_dir, filename)
+        if not os.path.exists(full_path):
+            return [f"data: File not found: {filename}\n\n"]
+
+        data = await asyncio.to_thread(Path(full_path).read_bytes)
+        content = data.decode('utf-8')
+
+        ext = Path(filename).suffix.lower()
+        regions = None
+        if CODEGEN_REGIONS and content.count('\n') >= CODEGEN_REGION_MIN_LINES:
+            regions = await asyncio.to_thread(
+                locate_regions, content, ext, [i['type'] for i in issues])
+
+        async with semaphore:
+            # One deadline for both attempts, so a file never holds its slot longer
+            deadline = time.monotonic() + CODEGEN_TIMEOUT
+            try:
+                optimized = None
+                if regions:
+                    optimized = await asyncio.wait_for(
+                        generate_region_code(content, ext, issues, regions), CODEGEN_TIMEOUT)
+                    if optimized is None:
+                        print(f"Falling back to a full rewrite of {filename}")
+                if optimized is None:
+                    optimized = await asyncio.wait_for(
+                        generate_optimized_code(content, issues), deadline - time.monotonic())
+                    if optimized:
+                        optimized = extract_codeblock_content(optimized)
+            except asyncio.TimeoutError:
+                return [f"data: Timed out generating optimized code for {filename}\n\n"]
+
+        if not optimized:
+            return [f"data: Failed to generate optimized code for {filename}\n\n"]
+
+        path = os.path.join(frontend_dir, filename)
+        event = {"issue_id": issue_ids[0], "issue_ids": issue_ids, "issues": issues, "path": path}
+        if payload == "full":
+            event.update(original=content, optimized=optimized)
+        else:
+            blob_sha = hashlib.sha1(b'blob %d\0' % len(data) + data).hexdigest()
+            originals.set(blob_sha, content)
+            event.update(original_sha=blob_sha, diff=unified_diff(path, content, optimized))
+        return [sse_event("code", event)]
     except Exception as e:
-        print(f"Error generating optimized code: {str(e)}")
-        return None
+        return [f"data: Error processing {filename}: {str(e)}\n\n"]
 
-async def generate_code(repo_path: str, frontend_dir: str, issues: List[Dict[str, Any]]):
+async def generate_code(repo_path: str, frontend_dir: str, issues: List[Dict[str, Any]],
+                        payload: str = "diff"):
     CODE_EXTENSIONS = {'.html', '.css', '.js', '.ts', '.jsx', '.tsx'}
-    
-    for issue in issues:
+    semaphore = asyncio.Semaphore(CODEGEN_CONCURRENCY)
+
+    # One prompt per file, so a file's issues land in a single consistent rewrite
+    by_file: Dict[str, List[int]] = {}
+    for issue_id, issue in enumerate(issues):
         filename = issue["file"]
         if filename is None:
             continue
-        file_ext = Path(filename).suffix.lower()
-        
-        if file_ext not in CODE_EXTENSIONS:
-            yield f"data: Skipping {filename} - not a code file\n\n"
+        if Path(filename).suffix.lower() not in CODE_EXTENSIONS:
+            if filename not in by_file:
+                yield f"data: Skipping {filename} - not a code file\n\n"
+                by_file[filename] = []
+            continue
+        by_file.setdefault(filename, []).append(issue_id)
+
+    tasks = []
+    for filename, issue_ids in by_file.items():
+        if not issue_ids:
             continue
-            
         yield f"data: Generating code suggestions for {filename}\n\n"
-        
-        try:
-            full_path = os.path.join(repo_path, frontend_dir, filename)
-            if not os.path.exists(full_path):
-                yield f"data: File not found: {filename}\n\n"
-                continue
+        tasks.append(asyncio.create_task(generate_file_code(
+            filename, issue_ids, [issues[i] for i in issue_ids],
+            repo_path, frontend_dir, semaphore, payload)))
 
-            content = await asyncio.to_thread(
-                Path(full_path).read_text, 
-                encoding='utf-8'
-            )
+    # Stream results in completion order; issue_id tells the client where each belongs
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            for msg in await next_done:
+                yield msg
+    finally:
+        for task in tasks:
+            task.cancel()
 
-            yield f"data: issue: {issue}\n\n"
-            
-            optimized = await generate_optimized_code(content, issue)
-            if optimized:
-                content = {"code": content}
-                optimized = {"code": extract_codeblock_content(optimized)}
-                yield f"data: path: {os.path.join(frontend_dir, filename)}\n\n"
-                yield f"data: original: {content}\n\n"
-                yield f"data: optimized: {optimized}\n\n"
-                
-                # # Save to database
-                # with sqlite3.connect('files.db') as conn:
-                #     c = conn.cursor()
-                #     c.execute('INSERT OR REPLACE INTO files (file_path, content) VALUES (?, ?)', 
-                #              (filename, optimized))
-                #     conn.commit()
-            else:
-                yield f"data: Failed to generate optimized code for {filename}\n\n"
-
-        except Exception as e:
-            yield f"data: Error processing {filename}: {str(e)}\n\n"
-
-async def analysis_generator(github_url: str):
+async def analysis_generator(github_url: str, refresh: bool = False,
+                             base: str | None = None, head: str | None = None,
+                             payload: str = "diff"):
+    if refresh:
+        llm_cache_bypass.set(True)
+    timings = start_timings()
+    started = time.perf_counter()
     temp_dir = tempfile.mkdtemp(prefix="repo_analysis_")
     repo_name = github_url.rstrip('/').split('/')[-1].replace('.git', '')
     repo_path = os.path.join(temp_dir, repo_name)
+    error = None
 
     try:
         yield "data: Cloning repository...\n\n"
-        await asyncio.to_thread(Repo.clone_from, github_url, repo_path)
+        with span('clone'):
+            commit = await asyncio.to_thread(mirror_pool.checkout, github_url, repo_path, head)
         yield "data: Repository cloned successfully\n\n"
 
+        changed_paths = None
+        base_commit = None
+        if base:
+            with span('diff'):
+                _, base_commit = await asyncio.to_thread(mirror_pool.fetch, github_url, base)
+                changed_paths = await asyncio.to_thread(
+                    mirror_pool.changed_paths, github_url, base_commit, commit)
+            yield f"data: Comparing {base_commit[:7]}..{commit[:7]}: {len(changed_paths)} changed files\n\n"
+
         # Find the frontend directory
         frontend_dir = '.'
         for root, dirs, _ in os.walk(repo_path):
@@ -155,43 +286,91 @@ async def analysis_generator(github_url: str):
             
         yield f"data: Using directory: {frontend_dir}\n\n"
 
+        if changed_paths is not None and frontend_dir != '.':
+            # git reports paths from the repo root; parse wants them relative to frontend_dir
+            prefix = frontend_dir.replace(os.sep, '/') + '/'
+            changed_paths = {p[len(prefix):]: status for p, status in changed_paths.items()
+                             if p.startswith(prefix)}
+
         issues = []
-        async for msg in parse(os.path.join(repo_path, frontend_dir)):
+        async for msg in parse(os.path.join(repo_path, frontend_dir),
+                               repo_key=f"{github_url.rstrip('/')}#{frontend_dir}",
+                               commit=commit, base_commit=base_commit,
+                               changed_paths=changed_paths):
             if msg["type"] == "progress":
                 yield f"data: {msg['message']}\n\n"
             elif msg["type"] == "metrics":
                 metrics = msg["data"]
                 carbon_per_view = estimate(metrics["total_bytes"])
-                yield f"data: carbon_per_view: {carbon_per_view['carbon_per_view']}\n\n"
+                yield sse_event("carbon_per_view", carbon_per_view['carbon_per_view'])
             elif msg["type"] == "issue":
                 issues.append(msg["data"])
                 # yield f"data: issue: {json.dumps(msg['data'])}\n\n"
+            elif msg["type"] == "enriched":
+                yield sse_event("enriched", msg['data'])
             elif msg["type"] == "result":
                 metrics = msg["metrics"]
                 issues = msg["issues"]
-                yield f"data: metrics: {json.dumps(metrics)}\n\n"
+                yield sse_event("metrics", metrics)
                 # yield f"data: issues: {json.dumps(issues)}\n\n"
         
-        async for msg in generate_code(repo_path, frontend_dir, issues):
-            if msg.startswith("issue:") or msg.startswith("path:") or msg.startswith("original:") or msg.startswith("optimized:"):
-                yield f"data: {msg}"
-            else:
-                yield msg
-        
-        yield "data: 🎉 All done!\n\n"
+        async for msg in timed('codegen', generate_code(repo_path, frontend_dir, issues, payload)):
+            yield msg
 
     except GitCommandError as e:
-        yield f"data: ❌ Git error: {str(e)}\n\n"
+        error = f"Git error: {str(e)}"
     except Exception as e:
-        yield f"data: ❌ Server error: {str(e)}\n\n"
+        error = f"Server error: {str(e)}"
     finally:
-        await asyncio.to_thread(shutil.rmtree, temp_dir)
+        await asyncio.to_thread(mirror_pool.release, repo_path)
+        await asyncio.to_thread(shutil.rmtree, temp_dir, ignore_errors=True)
         yield "data: Cleaned up temporary files\n\n"
 
-@app.get("/analyze")
-async def analyze_repository(github_url: str):
+    # Exactly one terminal event, so clients know to stop listening
+    if error is None:
+        yield sse_event("timings", {"stages": timings, "total": time.perf_counter() - started})
+        yield sse_event("done", {"commit": commit})
+    else:
+        yield f"data: ❌ {error}\n\n"
+        yield sse_event("failed", {"message": error})
+
+async def start_analysis_job(github_url: str, refresh: bool = False,
+                             base: str | None = None, head: str | None = None,
+                             payload: str = "diff"):
+    """Start an analysis, or join one already running for the same commit."""
+    if payload not in CODE_PAYLOADS:
+        raise HTTPException(status_code=400, detail=f"payload must be one of {CODE_PAYLOADS}")
+    if github_url.startswith("-"):
+        raise HTTPException(status_code=400, detail="Invalid repository URL")
+    for name, ref in (("base", base), ("head", head)):
+        if ref is not None and not valid_ref(ref):
+            raise HTTPException(status_code=400, detail=f"Invalid {name} ref")
+    key = None
+    try:
+        commit = await asyncio.to_thread(resolve_commit, github_url, head)
+        if commit:
+            key = (normalize_repo_url(github_url), commit, base, payload)
+    except GitCommandError as e:
+        # Let the job itself report the git failure
+        print(f"Could not resolve {github_url}: {str(e)}")
+
+    if key is not None and not refresh:
+        job = job_manager.find(key, ANALYSIS_RESULT_TTL)
+        if job is not None:
+            return job
+
+    async def run(job):
+        yield sse_event("job", {"job_id": job.id})
+        async for msg in analysis_generator(github_url, refresh, base, head, payload):
+            if msg.startswith("event: failed"):
+                job.failed = True
+            yield msg
+
+    return job_manager.start(run, key)
+
+def job_event_response(job, after: int = -1):
     response = StreamingResponse(
-        analysis_generator(github_url),
+        sse_stream(job, after),
         media_type="text/event-stream",
     )
 
@@ -199,23 +378,136 @@ async def analyze_repository(github_url: str):
     response.headers["X-Accel-Buffering"] = "no"
     return response
 
-@app.post("/save-file")
-async def save_file(file_path: str, content: str):
-    with sqlite3.connect('files.db') as conn:
-        c = conn.cursor()
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS files (
-                file_path TEXT PRIMARY KEY,
-                content TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        c.execute('INSERT OR REPLACE INTO files (file_path, content) VALUES (?, ?)', 
-                 (file_path, content))
-        conn.commit()
-    return {"message": "File saved successfully"}
+@app.get("/analyze")
+async def analyze_repository(github_url: str, refresh: bool = False,
+                             base: str | None = None, head: str | None = None,
+                             payload: str = "diff"):
+    job = await start_analysis_job(github_url, refresh, base, head, payload)
+    return job_event_response(job)
+
+@app.post("/jobs")
+async def create_job(github_url: str, refresh: bool = False,
+                     base: str | None = None, head: str | None = None,
+                     payload: str = "diff"):
+    job = await start_analysis_job(github_url, refresh, base, head, payload)
+    return {"job_id": job.id}
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, request: Request, last_event_id: int | None = None,
+                     polyfill_last_event_id: int | None = Query(None, alias="lastEventId")):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    # Browsers send Last-Event-ID on reconnect; the query params are for clients that can't.
+    # event-source-polyfill reconnects with ?lastEventId=<id> by default.
+    header = request.headers.get("last-event-id")
+    if header is not None and header.isdigit():
+        last_event_id = int(header)
+    elif last_event_id is None:
+        last_event_id = polyfill_last_event_id
+    return job_event_response(job, last_event_id if last_event_id is not None else -1)
+
+@app.get("/originals/{blob_sha}")
+async def get_original(blob_sha: str):
+    """Original file behind a diff payload; content-addressed, so cacheable forever."""
+    content = originals.get(blob_sha.lower())
+    if content is None:
+        raise HTTPException(status_code=404, detail="Original not found")
+    return PlainTextResponse(content, headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint (per process when running several workers)."""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/cache-stats")
+async def cache_stats():
+    return {"analysis": analysis_cache.stats(), "llm": llm_cache.stats()}
+
+def check_session_id(session_id: str):
+    if not valid_session_id(session_id):
+        raise HTTPException(status_code=400, detail="Invalid session_id")
+
+SAVE_ENCODINGS = ("", "identity", "gzip", "deflate")
+
+async def read_body(request: Request) -> bytes:
+    """Request body, refused with 413 as soon as it passes SAVE_MAX_BYTES."""
+    length = request.headers.get("content-length")
+    if length is not None:
+        if not length.isdigit():
+            raise HTTPException(status_code=400, detail="Invalid Content-Length")
+        if int(length) > SAVE_MAX_BYTES:
+            raise HTTPException(status_code=413, detail="Request body too large")
+    # Chunked uploads carry no length; count while streaming instead
+    chunks, size = [], 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > SAVE_MAX_BYTES:
+            raise HTTPException(status_code=413, detail="Request body too large")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+def decode_body(body: bytes, encoding: str) -> bytes:
+    """Undo Content-Encoding, refusing anything that inflates past SAVE_MAX_BYTES."""
+    if encoding in ("", "identity"):
+        data = body
+    elif encoding in ("gzip", "deflate"):
+        # wbits 32+ auto-detects the zlib or gzip header
+        inflater = zlib.decompressobj(32 + zlib.MAX_WBITS)
+        try:
+            data = inflater.decompress(body, SAVE_MAX_BYTES + 1)
+        except zlib.error:
+            raise HTTPException(status_code=400, detail="Malformed compressed body")
+    else:
+        raise HTTPException(status_code=415, detail=f"Unsupported Content-Encoding: {encoding}")
+    if len(data) > SAVE_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="Request body too large")
+    return data
+
+def parse_saved_files(data: bytes, content_type: str) -> List[Dict[str, Any]]:
+    """Files from a JSON {"files": [...]} body, or one JSON object per NDJSON line."""
+    try:
+        if "ndjson" in content_type:
+            return [json.loads(line) for line in data.splitlines() if line.strip()]
+        payload = json.loads(data)
+        return payload["files"] if isinstance(payload, dict) else payload
+    except (json.JSONDecodeError, UnicodeDecodeError, KeyError) as e:
+        raise HTTPException(status_code=400, detail=f"Malformed body: {str(e)}")
+
+@app.post("/save-files")
+async def save_files(request: Request, session_id: str):
+    """Save many edited files in one transaction.
+
+    The body is JSON {"files": [{"path", "content"}, ...]} or NDJSON with one
+    such object per line, optionally gzip-compressed via Content-Encoding.
+    """
+    check_session_id(session_id)
+    encoding = request.headers.get("content-encoding", "").lower()
+    if encoding not in SAVE_ENCODINGS:
+        raise HTTPException(status_code=415, detail=f"Unsupported Content-Encoding: {encoding}")
+    data = decode_body(await read_body(request), encoding)
+    entries = parse_saved_files(data, request.headers.get("content-type", ""))
+    if not isinstance(entries, list) or len(entries) > SAVE_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"Expected at most {SAVE_MAX_FILES} files")
+
+    files = []
+    for entry in entries:
+        if not isinstance(entry, dict) or not isinstance(entry.get("content"), str):
+            raise HTTPException(status_code=400, detail="Each file needs a path and string content")
+        path = normalize_file_path(entry.get("path") or "")
+        if path is None:
+            raise HTTPException(status_code=400, detail=f"Invalid file path: {entry.get('path')!r}")
+        files.append((path, entry["content"]))
+
+    saved = await asyncio.to_thread(file_store.save_many, session_id, files)
+    return {"message": "Files saved successfully", "saved": saved}
 
 @app.post("/create-branch")
-async def create_branch(github_url: str, installation_id: str):
-    await asyncio.to_thread(create_and_push_branch, github_url, "sustainability-improvements", installation_id= int(installation_id))
+async def create_branch(github_url: str, installation_id: str, session_id: str):
+    check_session_id(session_id)
+    created = await asyncio.to_thread(
+        create_and_push_branch, github_url, "sustainability-improvements",
+        installation_id=int(installation_id), session_id=session_id)
+    if not created:
+        raise HTTPException(status_code=502, detail="Failed to create branch")
     return {"message": "Branch created successfully"}
\ No newline at end of file
@@ -0,0 +1,104 @@
+import logging
+import os
+import posixpath
+import re
+import sqlite3
+import threading
+import time
+from typing import Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+FILES_DB_PATH = os.getenv('FILES_DB_PATH', 'files.db')
+# Saved edits nobody turned into a branch are dropped after this many seconds
+FILES_RETENTION = float(os.getenv('FILES_RETENTION', 7 * 24 * 3600))
+
+SESSION_ID_RE = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+MAX_PATH_LENGTH = 1024
+
+# Statements are module constants so sqlite3's per-connection cache reuses them
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS session_files (
+        session_id TEXT NOT NULL,
+        file_path TEXT NOT NULL,
+        content TEXT NOT NULL,
+        updated_at REAL NOT NULL,
+        PRIMARY KEY (session_id, file_path)
+    );
+    CREATE INDEX IF NOT EXISTS session_files_updated_at ON session_files (updated_at);
+'''
+UPSERT_FILE = '''
+    INSERT INTO session_files (session_id, file_path, content, updated_at)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT (session_id, file_path)
+    DO UPDATE SET content = excluded.content, updated_at = excluded.updated_at
+'''
+SELECT_FILES = 'SELECT file_path, content FROM session_files WHERE session_id = ? ORDER BY file_path'
+DELETE_SESSION = 'DELETE FROM session_files WHERE session_id = ?'
+DELETE_STALE = 'DELETE FROM session_files WHERE updated_at < ?'
+
+
+def valid_session_id(session_id: str) -> bool:
+    return bool(SESSION_ID_RE.match(session_id or ''))
+
+
+def normalize_file_path(path: str) -> Optional[str]:
+    """Repo-relative POSIX form of path, or None if it could escape the checkout."""
+    if not path or len(path) > MAX_PATH_LENGTH or '\0' in path or '\\' in path:
+        return None
+    norm = posixpath.normpath(path)
+    if norm.startswith('/') or norm == '.' or norm == '..' or norm.startswith('../'):
+        return None
+    if norm.split('/')[0] == '.git':
+        return None
+    return norm
+
+
+class FileStore:
+    """Edited files awaiting a branch, namespaced by the client's session id."""
+
+    def __init__(self, path: str = FILES_DB_PATH, retention: float = FILES_RETENTION):
+        self.path = path
+        self.retention = retention
+        # One connection per thread: request handlers and to_thread workers each reuse theirs
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def save_many(self, session_id: str, files: Iterable[Tuple[str, str]]) -> int:
+        """Upsert (path, content) pairs in a single transaction; return the count."""
+        now = time.time()
+        rows = [(session_id, path, content, now) for path, content in files]
+        with self._conn() as conn:
+            conn.executemany(UPSERT_FILE, rows)
+        return len(rows)
+
+    def save(self, session_id: str, file_path: str, content: str):
+        self.save_many(session_id, [(file_path, content)])
+
+    def files(self, session_id: str) -> List[Tuple[str, str]]:
+        return self._conn().execute(SELECT_FILES, (session_id,)).fetchall()
+
+    def clear(self, session_id: str):
+        with self._conn() as conn:
+            conn.execute(DELETE_SESSION, (session_id,))
+
+    def prune(self) -> int:
+        """Drop edits older than the retention window; return rows removed."""
+        with self._conn() as conn:
+            removed = conn.execute(DELETE_STALE, (time.time() - self.retention,)).rowcount
+        if removed:
+            logger.info('Pruned %d stale saved files', removed)
+        return removed
+
+
+file_store = FileStore()
@@ -0,0 +1,105 @@
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import AsyncIterator, Dict, Optional, TypeVar
+from prometheus_client import Counter, Gauge, Histogram
+from prometheus_client.core import CounterMetricFamily, REGISTRY
+
+STAGE_SECONDS = Histogram(
+    'reporeleaf_stage_seconds', 'Wall time spent in each analysis stage', ['stage'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300))
+LLM_REQUEST_SECONDS = Histogram(
+    'reporeleaf_llm_request_seconds', 'Latency of Gemini requests', ['model', 'stage'],
+    buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120))
+LLM_REQUESTS = Counter(
+    'reporeleaf_llm_requests_total', 'Gemini requests by outcome', ['model', 'stage', 'outcome'])
+LLM_TOKENS = Counter(
+    'reporeleaf_llm_tokens_total', 'Tokens reported by Gemini', ['model', 'kind'])
+ACTIVE_JOBS = Gauge('reporeleaf_active_jobs', 'Analysis jobs currently running')
+
+T = TypeVar('T')
+
+# Stage the current task is in, used to label LLM calls
+current_stage: contextvars.ContextVar[str] = contextvars.ContextVar('current_stage', default='none')
+# Per-analysis stage totals; the dict is shared with tasks and threads spawned from it
+_timings: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar(
+    'stage_timings', default=None)
+
+
+def start_timings() -> Dict[str, float]:
+    """Collect span durations for the rest of this task into a fresh dict."""
+    timings: Dict[str, float] = {}
+    _timings.set(timings)
+    return timings
+
+
+def _record_stage(stage: str, elapsed: float):
+    STAGE_SECONDS.labels(stage).observe(elapsed)
+    timings = _timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + elapsed
+
+
+@contextmanager
+def span(stage: str):
+    """Time a stage into the histogram and the current analysis' timings."""
+    token = current_stage.set(stage)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        current_stage.reset(token)
+        _record_stage(stage, time.perf_counter() - start)
+
+
+async def timed(stage: str, items: AsyncIterator[T]) -> AsyncIterator[T]:
+    """Re-yield items, timing only the waits for each one as stage.
+
+    Unlike a span around the loop, time the consumer spends on an item
+    (job log writes, a slow client) is not counted.
+    """
+    elapsed = 0.0
+    try:
+        while True:
+            token = current_stage.set(stage)
+            start = time.perf_counter()
+            try:
+                item = await items.__anext__()
+            except StopAsyncIteration:
+                return
+            finally:
+                elapsed += time.perf_counter() - start
+                current_stage.reset(token)
+            yield item
+    finally:
+        _record_stage(stage, elapsed)
+
+
+def record_llm_call(model: str, seconds: float, outcome: str,
+                    usage: Optional[Dict[str, int]] = None):
+    stage = current_stage.get()
+    LLM_REQUEST_SECONDS.labels(model, stage).observe(seconds)
+    LLM_REQUESTS.labels(model, stage, outcome).inc()
+    if usage:
+        LLM_TOKENS.labels(model, 'prompt').inc(usage.get('promptTokenCount', 0))
+        LLM_TOKENS.labels(model, 'output').inc(usage.get('candidatesTokenCount', 0))
+
+
+class CacheCollector:
+    """Exports hit/miss counts of DiskCache instances at scrape time."""
+
+    def __init__(self, caches):
+        self.caches = caches
+
+    def collect(self):
+        hits = CounterMetricFamily('reporeleaf_cache_hits', 'Cache hits', labels=['cache'])
+        misses = CounterMetricFamily('reporeleaf_cache_misses', 'Cache misses', labels=['cache'])
+        for name, cache in self.caches.items():
+            hits.add_metric([name], cache.hits)
+            misses.add_metric([name], cache.misses)
+        yield hits
+        yield misses
+
+
+def register_caches(**caches):
+    REGISTRY.register(CacheCollector(caches))
@@ -0,0 +1,41 @@
+import time
+
+from cache import DiskCache
+
+
+def test_disk_cache_counts_hits_and_evicts_least_recently_used(tmp_path):
+    cache = DiskCache(str(tmp_path / 'cache.db'), max_bytes=30)
+    cache.set('a', 'x' * 10)
+    time.sleep(0.01)
+    cache.set('b', 'y' * 10)
+    time.sleep(0.01)
+    assert cache.get('a') == 'x' * 10  # 'a' is now the most recently used
+    time.sleep(0.01)
+    cache.set('c', 'z' * 10)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 'x' * 10
+    assert cache.get('c') == 'z' * 10
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_disk_cache_persists_between_instances(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    DiskCache(path, max_bytes=1024).set('key', {'issues': []})
+    assert DiskCache(path, max_bytes=1024).get('key') == {'issues': []}
+
+
+def test_disk_cache_expires_entries_after_ttl(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, 'time', lambda: now[0])
+    cache = DiskCache(str(tmp_path / 'cache.db'), max_bytes=1024, ttl=60)
+    cache.set('key', 'value')
+
+    now[0] += 59
+    assert cache.get('key') == 'value'
+    # Reads don't extend the lifetime; it counts from when the entry was stored
+    now[0] += 2
+    assert cache.get('key') is None
+    assert cache.stats()['bytes'] == 0
+    cache.set('key', 'fresh')
+    assert cache.get('key') == 'fresh'
@@ -0,0 +1,65 @@
+import asyncio
+import json
+import os
+import time
+
+import server
+
+
+def test_one_rewrite_per_file_covers_all_its_issues(tmp_path, monkeypatch):
+    (tmp_path / 'src').mkdir()
+    (tmp_path / 'src' / 'a.js').write_text('for (a of b) { for (c of d) {} }\n')
+    (tmp_path / 'src' / 'b.css').write_text('.x { color: red }\n')
+    calls = []
+
+    async def fake_generate(content, issues):
+        calls.append([i['type'] for i in issues])
+        return content.replace('red', 'blue') + '// optimized\n'
+
+    monkeypatch.setattr(server, 'generate_optimized_code', fake_generate)
+    issues = [
+        {'type': 'NestedLoop', 'file': 'src/a.js'},
+        {'type': 'UnusedCSS', 'file': 'src/b.css'},
+        {'type': 'NoCodeSplitting', 'file': 'src/a.js'},
+        {'type': 'LegacyImageFormat', 'file': 'img.png'},
+        {'type': 'Reduce DOM size', 'file': None},
+    ]
+
+    async def run():
+        return [m async for m in server.generate_code(str(tmp_path), '.', issues, 'full')]
+
+    messages = asyncio.run(run())
+    events = [json.loads(m.split('data: ', 1)[1]) for m in messages if m.startswith('event: code')]
+    assert sorted(calls) == [['NestedLoop', 'NoCodeSplitting'], ['UnusedCSS']]
+    by_path = {os.path.normpath(e['path']): e for e in events}
+    assert by_path['src/a.js']['issue_ids'] == [0, 2]
+    assert by_path['src/a.js']['issue_id'] == 0
+    assert by_path['src/b.css']['optimized'].startswith('.x { color: blue }')
+    assert sum('Skipping img.png' in m for m in messages) == 1
+
+
+def test_region_attempt_and_fallback_share_one_deadline(tmp_path, monkeypatch):
+    content = ''.join(f'const v{i} = {i}\n' for i in range(300))
+    content += 'for (a of b) { for (c of d) {} }\n'
+    (tmp_path / 'big.js').write_text(content)
+    monkeypatch.setattr(server, 'CODEGEN_TIMEOUT', 0.3)
+    monkeypatch.setattr(server, 'CODEGEN_REGIONS', True)
+
+    async def slow_regions(*args):
+        # Uses most of the budget, then gives up on the region reply
+        await asyncio.sleep(0.2)
+        return None
+
+    async def slow_rewrite(content, issues):
+        await asyncio.sleep(0.2)
+        return content
+
+    monkeypatch.setattr(server, 'generate_region_code', slow_regions)
+    monkeypatch.setattr(server, 'generate_optimized_code', slow_rewrite)
+
+    start = time.monotonic()
+    messages = asyncio.run(server.generate_file_code(
+        'big.js', [0], [{'type': 'NestedLoop', 'file': 'big.js'}], str(tmp_path), '.',
+        asyncio.Semaphore(1)))
+    assert 'Timed out' in messages[0]
+    assert time.monotonic() - start < 0.35
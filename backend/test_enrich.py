@@ -0,0 +1,129 @@
+import asyncio
+import json
+import time
+
+import parser
+from cache import DiskCache
+from llm_client import RateLimiter
+
+
+def collect(issues):
+    async def run():
+        out = []
+        async for chunk in parser.enrich_issues_concurrently(issues):
+            if chunk is not None:
+                out.extend(chunk)
+        return out
+    return asyncio.run(run())
+
+
+def test_types_are_enriched_once_and_fanned_out(tmp_path, monkeypatch):
+    monkeypatch.setattr(parser, 'llm_cache', DiskCache(str(tmp_path / 'llm.db'), 1 << 20))
+    prompts = []
+
+    async def fake_gemini(prompt):
+        prompts.append(prompt)
+        if 'Issue types:' in prompt:
+            types = json.loads(prompt.split('Issue types:\n')[1].split('\n\nReturn')[0])
+            return [{'type': t, 'severity': 'High', 'impact': f'{t} impact',
+                     'solution': f'{t} fix'} for t in types]
+        return [{'type': 'NestedLoop', 'file': 'a.js', 'severity': 'High',
+                 'impact': 'loops', 'solution': 'hoist'}]
+
+    monkeypatch.setattr(parser, 'call_gemini', fake_gemini)
+    issues = [{'type': 'NoCodeSplitting', 'file': f'src/f{i}.js'} for i in range(40)]
+    issues += [{'type': 'MissingCachePolicy', 'file': f'f{i}.html'} for i in range(3)]
+    issues.append({'type': 'NestedLoop', 'file': 'a.js'})
+
+    enriched = collect(issues)
+    assert len(enriched) == len(issues)
+    assert len(prompts) == 2
+    by_file = {i['file']: i for i in enriched}
+    assert by_file['src/f39.js']['impact'] == 'NoCodeSplitting impact'
+    assert by_file['f2.html']['solution'] == 'MissingCachePolicy fix'
+    assert by_file['a.js']['solution'] == 'hoist'
+
+    # A later analysis reuses the stored type text without asking again
+    prompts.clear()
+    enriched = collect(issues[:40] + [{'type': 'MissingCachePolicy', 'file': 'new.html'}])
+    assert prompts == []
+    assert {i['impact'] for i in enriched} == {'NoCodeSplitting impact', 'MissingCachePolicy impact'}
+
+
+def per_issue_mode(monkeypatch, **settings):
+    """Issue-mode enrichment with no rate limit, overridden by settings."""
+    monkeypatch.setattr(parser, 'ENRICH_MODE', 'issue')
+    monkeypatch.setattr(parser, 'ENRICH_RATE_PER_SEC', 0)
+    for name, value in settings.items():
+        monkeypatch.setattr(parser, name, value)
+
+
+def echo_meta(prompt, solution):
+    issues = json.loads(prompt.split('Issues:\n')[1].split('\n\nReturn')[0])
+    return [dict(i, severity='High', impact='specific', solution=solution) for i in issues]
+
+
+def test_chunks_past_the_call_cap_get_generic_text(monkeypatch):
+    per_issue_mode(monkeypatch, ENRICH_MAX_CALLS=2, ENRICH_CONCURRENCY=4)
+    prompts = []
+
+    async def fake_gemini(prompt):
+        prompts.append(prompt)
+        return echo_meta(prompt, 'hoist')
+
+    monkeypatch.setattr(parser, 'call_gemini', fake_gemini)
+    issues = [{'type': 'NestedLoop', 'file': f'f{i}.js'} for i in range(4 * parser.ENRICH_CHUNK_SIZE)]
+
+    enriched = collect(issues)
+    assert len(prompts) == 2
+    assert sorted(i['file'] for i in enriched) == sorted(i['file'] for i in issues)
+    solutions = [i['solution'] for i in enriched]
+    assert solutions.count('hoist') == 2 * parser.ENRICH_CHUNK_SIZE
+    assert solutions.count('Refer to guidelines') == 2 * parser.ENRICH_CHUNK_SIZE
+
+
+def test_calls_over_the_time_budget_fall_back_and_stream_in_completion_order(monkeypatch):
+    per_issue_mode(monkeypatch, ENRICH_TIME_BUDGET=0.3)
+
+    async def fake_gemini(prompt):
+        if '"slow' in prompt:
+            await asyncio.sleep(5)
+        return echo_meta(prompt, 'specific fix')
+
+    monkeypatch.setattr(parser, 'call_gemini', fake_gemini)
+    slow = [{'type': 'NestedLoop', 'file': f'slow{i}.js'} for i in range(parser.ENRICH_CHUNK_SIZE)]
+    fast = [{'type': 'NestedLoop', 'file': f'fast{i}.js'} for i in range(parser.ENRICH_CHUNK_SIZE)]
+
+    async def run():
+        chunks = []
+        async for chunk in parser.enrich_issues_concurrently(slow + fast):
+            if chunk is not None:
+                chunks.append((time.monotonic(), chunk))
+        return chunks
+
+    start = time.monotonic()
+    (fast_at, first), (slow_at, second) = asyncio.run(run())
+    # The fast chunk is yielded right away, not held back behind the slow one
+    assert fast_at - start < 0.2
+    assert [i['file'] for i in first] == [i['file'] for i in fast]
+    assert {i['solution'] for i in first} == {'specific fix'}
+    # The slow chunk is cut off at the budget and still reported, generically
+    assert slow_at - start < 1
+    assert [i['file'] for i in second] == [i['file'] for i in slow]
+    assert {i['solution'] for i in second} == {'Refer to guidelines'}
+
+
+def test_rate_limiter_spaces_out_request_starts():
+    async def starts(limiter, n):
+        out = []
+        for _ in range(n):
+            await limiter.wait()
+            out.append(time.monotonic())
+        return out
+
+    times = asyncio.run(starts(RateLimiter(20), 5))
+    gaps = [b - a for a, b in zip(times, times[1:])]
+    assert all(gap >= 0.045 for gap in gaps)
+
+    unlimited = asyncio.run(starts(RateLimiter(0), 50))
+    assert unlimited[-1] - unlimited[0] < 0.05
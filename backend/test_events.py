@@ -0,0 +1,38 @@
+import json
+
+from git import Git
+
+from events import sse_event, unified_diff
+
+
+def test_sse_event_is_named_json():
+    assert sse_event('metrics', {'total_bytes': 3}) == 'event: metrics\ndata: {"total_bytes": 3}\n\n'
+    # Multi-line payloads must stay on one data: line
+    msg = sse_event('code', {'diff': 'a\nb'})
+    assert json.loads(msg.split('data: ', 1)[1]) == {'diff': 'a\nb'}
+
+
+def test_unified_diff_applies_without_trailing_newlines(tmp_path):
+    original = 'const a = 1\nconst b = 2\nconsole.log(a)'
+    optimized = 'const a = 1\nconsole.log(a)\nexport {}'
+    (tmp_path / 'app.js').write_text(original)
+
+    patch = tmp_path / 'change.diff'
+    patch.write_text(unified_diff('app.js', original, optimized))
+    Git(str(tmp_path)).apply(str(patch))
+
+    assert (tmp_path / 'app.js').read_text() == optimized
+
+
+def test_unified_diff_keeps_unicode_line_separators_inside_lines(tmp_path):
+    original = 'const s = "a\u2028b"\n/* page\x0cbreak */\nlet x = 1\n'
+    optimized = 'const s = "a\u2028b"\n/* page\x0cbreak */\nconst x = 1\n'
+    (tmp_path / 'app.js').write_bytes(original.encode())
+
+    diff = unified_diff('app.js', original, optimized)
+    assert diff.count('\n') == 7
+    patch = tmp_path / 'change.diff'
+    patch.write_bytes(diff.encode())
+    Git(str(tmp_path)).apply(str(patch))
+
+    assert (tmp_path / 'app.js').read_bytes().decode() == optimized
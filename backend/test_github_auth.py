@@ -0,0 +1,130 @@
+import json
+import os
+import subprocess
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+import github_auth
+from storage import FileStore
+
+
+def git(repo, *args, input=None, env=None):
+    cmd = ['git', '-c', 'user.name=t', '-c', 'user.email=t@e', '--git-dir', repo, *args]
+    return subprocess.run(cmd, input=input, env=env, capture_output=True, text=True,
+                          check=True).stdout.strip()
+
+
+class StandIn(BaseHTTPRequestHandler):
+    """Just enough of GitHub's REST API, backed by a local bare repo."""
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        repo, prefix = self.server.repo, '/repos/octo/site'
+        self.server.calls.append(('GET', self.path))
+        if self.path == prefix:
+            return self.reply(200, {'default_branch': 'main'})
+        if self.path.startswith(prefix + '/git/ref/heads/'):
+            branch = self.path.rsplit('/', 1)[1]
+            return self.reply(200, {'object': {'sha': git(repo, 'rev-parse', branch)}})
+        if self.path.startswith(prefix + '/git/commits/'):
+            sha = self.path.rsplit('/', 1)[1]
+            return self.reply(200, {'tree': {'sha': git(repo, 'rev-parse', f'{sha}^{{tree}}')}})
+        self.reply(404, {'message': 'Not Found'})
+
+    def do_POST(self):
+        repo = self.server.repo
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+        self.server.calls.append(('POST', self.path))
+        if self.path.endswith('/access_tokens'):
+            assert self.headers['Authorization'].startswith('Bearer ')
+            return self.reply(201, {'token': f'tok{len(self.server.calls)}',
+                                    'expires_at': '2999-01-01T00:00:00Z'})
+        assert self.headers['Authorization'].startswith('token tok')
+        if self.path.endswith('/git/trees'):
+            env = {**os.environ, 'GIT_INDEX_FILE': os.path.join(self.server.tmp, 'index')}
+            git(repo, 'read-tree', body['base_tree'], env=env)
+            for entry in body['tree']:
+                blob = git(repo, 'hash-object', '-w', '--stdin', input=entry['content'])
+                git(repo, 'update-index', '--add', '--cacheinfo',
+                    f"{entry['mode']},{blob},{entry['path']}", env=env)
+            return self.reply(201, {'sha': git(repo, 'write-tree', env=env)})
+        if self.path.endswith('/git/commits'):
+            parents = [a for p in body['parents'] for a in ('-p', p)]
+            sha = git(repo, 'commit-tree', body['tree'], *parents, '-m', body['message'])
+            return self.reply(201, {'sha': sha})
+        if self.path.endswith('/git/refs'):
+            if subprocess.run(['git', '--git-dir', repo, 'rev-parse', '--verify', body['ref']],
+                              capture_output=True).returncode == 0:
+                return self.reply(422, {'message': 'Reference already exists'})
+            git(repo, 'update-ref', body['ref'], body['sha'])
+            return self.reply(201, {'ref': body['ref']})
+        self.reply(404, {'message': 'Not Found'})
+
+
+@pytest.fixture
+def github(tmp_path, monkeypatch):
+    work = tmp_path / 'work'
+    subprocess.run(['git', 'init', '-q', '-b', 'main', str(work)], check=True)
+    (work / 'src').mkdir()
+    (work / 'src' / 'app.js').write_text('old\n')
+    (work / 'README.md').write_text('readme\n')
+    subprocess.run(['git', '-C', str(work), 'add', '-A'], check=True)
+    subprocess.run(['git', '-C', str(work), '-c', 'user.name=t', '-c', 'user.email=t@e',
+                    'commit', '-qm', 'init'], check=True)
+    bare = str(tmp_path / 'site.git')
+    subprocess.run(['git', 'clone', '-q', '--bare', str(work), bare], check=True)
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = tmp_path / 'app.pem'
+    pem.write_bytes(key.private_bytes(serialization.Encoding.PEM,
+                                      serialization.PrivateFormat.PKCS8,
+                                      serialization.NoEncryption()))
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandIn)
+    server.repo, server.tmp, server.calls = bare, str(tmp_path), []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(github_auth, 'GITHUB_API_URL', f'http://127.0.0.1:{server.server_port}')
+    monkeypatch.setattr(github_auth, 'app_id', '1')
+    monkeypatch.setattr(github_auth, 'private_key_path', str(pem))
+    monkeypatch.setattr(github_auth, '_private_key', None)
+    monkeypatch.setattr(github_auth, '_jwt', (None, 0.0))
+    monkeypatch.setattr(github_auth, '_installation_tokens', {})
+    monkeypatch.setattr(github_auth, 'file_store', FileStore(str(tmp_path / 'files.db')))
+    yield server
+    server.shutdown()
+
+
+def test_branch_is_built_from_saved_files_without_a_clone(github):
+    store = github_auth.file_store
+    store.save_many('s1', [('src/app.js', 'new\n'), ('src/added.css', '.a {}\n')])
+    assert github_auth.create_and_push_branch(
+        'https://github.com/octo/site.git', 'improve', installation_id=7, session_id='s1')
+
+    repo = github.repo
+    assert git(repo, 'show', 'improve:src/app.js') == 'new'
+    assert git(repo, 'show', 'improve:src/added.css') == '.a {}'
+    assert git(repo, 'show', 'improve:README.md') == 'readme'
+    assert git(repo, 'rev-parse', 'improve^') == git(repo, 'rev-parse', 'main')
+    assert store.files('s1') == []
+
+    # The installation token is reused; an existing branch is reported, not overwritten
+    store.save('s2', 'src/app.js', 'newer\n')
+    assert not github_auth.create_and_push_branch(
+        'https://github.com/octo/site', 'improve', installation_id=7, session_id='s2')
+    assert [c for c in github.calls if c[1].endswith('/access_tokens')] == \
+        [('POST', '/app/installations/7/access_tokens')]
+    assert store.files('s2') == [('src/app.js', 'newer\n')]
@@ -0,0 +1,32 @@
+from PIL import Image
+
+from images import analyze_image, image_issues
+
+
+def test_legacy_images_report_measured_savings(tmp_path):
+    path = tmp_path / 'photo.jpg'
+    img = Image.new('RGB', (1200, 900))
+    img.putdata([((x * 7) % 256, (x * 13) % 256, (x * 29) % 256) for x in range(1200 * 900)])
+    img.save(path, quality=95)
+
+    analysis = analyze_image(str(path))
+    assert (analysis['format'], analysis['width'], analysis['height']) == ('JPEG', 1200, 900)
+    assert 0 < analysis['transcoded']['webp'] < analysis['bytes']
+
+    issues = {i['type']: i for i in image_issues('.jpg', analysis)}
+    assert issues['LegacyImageFormat']['estimated_savings_bytes'] == \
+        analysis['bytes'] - analysis['transcoded']['webp']
+    assert 'OversizedImage' in issues
+
+
+def test_modern_and_unreadable_images(tmp_path):
+    path = tmp_path / 'small.webp'
+    Image.new('RGB', (10, 10)).save(path)
+    analysis = analyze_image(str(path))
+    assert analysis['transcoded'] == {}
+    assert image_issues('.webp', analysis) == []
+
+    broken = tmp_path / 'broken.png'
+    broken.write_bytes(b'not a png')
+    assert analyze_image(str(broken)) is None
+    assert [i['type'] for i in image_issues('.png', None)] == ['LegacyImageFormat']
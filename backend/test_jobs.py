@@ -0,0 +1,86 @@
+import asyncio
+import json
+
+from jobs import JobManager, sse_stream
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def collect(job, after=-1):
+    return [item async for item in job.tail(after)]
+
+
+def test_replay_after_last_event_id_and_live_tail(tmp_path):
+    async def scenario():
+        manager = JobManager(str(tmp_path))
+        gate = asyncio.Event()
+
+        async def work(job):
+            yield 'data: one\n\n'
+            yield 'data: two\n\n'
+            await gate.wait()
+            yield 'data: three\n\n'
+
+        job = manager.start(work)
+        # Two viewers attach while the job is still running
+        viewers = [asyncio.create_task(collect(job)), asyncio.create_task(collect(job, after=0))]
+        await asyncio.sleep(0.05)
+        assert not job.done and len(job.events) == 2
+        gate.set()
+        full, resumed = await asyncio.gather(*viewers)
+        assert [m for _, m in full] == ['data: one\n\n', 'data: two\n\n', 'data: three\n\n']
+        assert resumed == full[1:]
+
+        # A reconnect with Last-Event-ID 1 gets only what came after it
+        frames = [f async for f in sse_stream(job, after=1)]
+        assert frames == ['id: 2\ndata: three\n\n']
+        return job
+
+    job = run(scenario())
+    assert job.done and not job.failed
+
+
+def test_failures_end_with_a_failed_event(tmp_path):
+    async def scenario():
+        manager = JobManager(str(tmp_path))
+
+        async def work(job):
+            yield 'data: starting\n\n'
+            raise RuntimeError('boom')
+
+        job = manager.start(work, key='k')
+        await job.task
+        return manager, job
+
+    manager, job = run(scenario())
+    assert job.failed and manager.find('k', 60) is None
+    assert job.events[-1].startswith('event: failed\n')
+    assert json.loads(job.events[-1].split('data: ', 1)[1]) == {'message': 'Server error: boom'}
+
+
+def test_jobs_reload_from_disk_after_a_restart(tmp_path):
+    async def scenario():
+        manager = JobManager(str(tmp_path))
+
+        async def work(job):
+            yield 'data: a\n\n'
+            yield 'event: done\ndata: {}\n\n'
+
+        job = manager.start(work)
+        await job.task
+        return job.id
+
+    job_id = run(scenario())
+    restarted = JobManager(str(tmp_path))
+    job = restarted.get(job_id)
+    assert job.done and not job.failed
+    assert run(collect(job, after=0)) == [(1, 'event: done\ndata: {}\n\n')]
+
+    # A run the restart cut short (no done record) replays as failed
+    with open(tmp_path / f'{"0" * 32}.jsonl', 'w') as f:
+        f.write(json.dumps({'id': 0, 'msg': 'data: a\n\n'}) + '\n')
+    cut = restarted.get('0' * 32)
+    assert cut.failed and cut.events[-1].startswith('event: failed\n')
+    assert restarted.get('../etc/passwd') is None
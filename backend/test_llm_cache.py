@@ -0,0 +1,67 @@
+import asyncio
+
+import llm_cache
+import parser
+import server
+from cache import DiskCache
+from llm_cache import llm_cache_bypass, llm_cache_key
+
+
+def use_temp_cache(tmp_path, monkeypatch):
+    cache = DiskCache(str(tmp_path / 'llm.db'), 1 << 20)
+    monkeypatch.setattr(llm_cache, 'llm_cache', cache)
+    return cache
+
+
+def fake_generate(monkeypatch, responses):
+    """Make the shared LLM client answer from responses, recording each prompt."""
+    prompts = []
+
+    async def generate(prompt, model, config=None):
+        prompts.append(prompt)
+        return responses.pop(0)
+
+    monkeypatch.setattr(parser.llm_client, 'generate', generate)
+    return prompts
+
+
+def run_bypassed(coro):
+    async def run():
+        # Mirrors what analysis_generator does for refresh=true
+        llm_cache_bypass.set(True)
+        return await coro
+    return asyncio.run(run())
+
+
+def test_bypass_skips_reads_but_stores_the_fresh_response(tmp_path, monkeypatch):
+    cache = use_temp_cache(tmp_path, monkeypatch)
+    prompts = fake_generate(monkeypatch, ['[{"type": "fresh"}]'])
+    cache.set(llm_cache_key(parser.GEMINI_MODEL, parser.GEMINI_CONFIG, 'p'), '[{"type": "stale"}]')
+
+    assert run_bypassed(parser.call_gemini('p')) == [{'type': 'fresh'}]
+    assert prompts == ['p']
+    # Without the bypass the refreshed answer is served from cache
+    assert asyncio.run(parser.call_gemini('p')) == [{'type': 'fresh'}]
+    assert prompts == ['p']
+
+
+def test_codegen_bypass_skips_reads_but_stores_the_fresh_response(tmp_path, monkeypatch):
+    cache = use_temp_cache(tmp_path, monkeypatch)
+    prompts = fake_generate(monkeypatch, ['new code'])
+    cache.set(llm_cache_key(server.CODEGEN_MODEL, {}, 'p'), 'old code')
+
+    assert asyncio.run(server.generate_codegen_text('p')) == 'old code'
+    assert run_bypassed(server.generate_codegen_text('p')) == 'new code'
+    assert asyncio.run(server.generate_codegen_text('p')) == 'new code'
+    assert prompts == ['p']
+
+
+def test_invalid_json_is_not_cached(tmp_path, monkeypatch):
+    cache = use_temp_cache(tmp_path, monkeypatch)
+    prompts = fake_generate(monkeypatch, ['not json', 'still {not json'])
+
+    assert asyncio.run(parser.call_gemini('p')) is None
+    assert len(prompts) == 2
+    for prompt in prompts:
+        assert cache.get(llm_cache_key(parser.GEMINI_MODEL, parser.GEMINI_CONFIG, prompt)) is None
+    assert cache.stats()['bytes'] == 0
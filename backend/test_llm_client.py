@@ -0,0 +1,83 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from prometheus_client import REGISTRY
+
+import llm_stub
+from llm_client import LLMClient, LLMError
+
+
+def recording_stub(monkeypatch, seen):
+    """llm_stub without its latency, recording each request it receives."""
+    monkeypatch.setattr(llm_stub, 'LLM_STUB_LATENCY', 0)
+    monkeypatch.setattr(llm_stub, 'LLM_STUB_RESPONSE', '[{"type": "NestedLoop"}]')
+
+    async def app(scope, receive, send):
+        body = []
+
+        async def recording_receive():
+            message = await receive()
+            body.append(message.get('body', b''))
+            return message
+
+        await llm_stub.app(scope, recording_receive, send)
+        if scope['type'] == 'http':
+            seen.append((scope['path'], dict(scope['headers']), b''.join(body)))
+
+    return httpx.ASGITransport(app=app)
+
+
+def tokens(model, kind):
+    return REGISTRY.get_sample_value('reporeleaf_llm_tokens_total',
+                                     {'model': model, 'kind': kind}) or 0
+
+
+def test_generate_against_the_stub(monkeypatch):
+    seen = []
+    client = LLMClient(api_key='k', base_url='http://stub', transport=recording_stub(monkeypatch, seen))
+    prompt = 'x' * 400
+    before = tokens('m', 'prompt'), tokens('m', 'output')
+
+    async def run():
+        text = await client.generate(prompt, 'm', {'temperature': 0.1})
+        await client.aclose()
+        return text
+
+    assert asyncio.run(run()) == '[{"type": "NestedLoop"}]'
+    path, headers, body = seen[0]
+    assert path == '/v1beta/models/m:generateContent'
+    assert headers[b'x-goog-api-key'] == b'k'
+    assert json.loads(body) == {'contents': [{'role': 'user', 'parts': [{'text': prompt}]}],
+                                'generationConfig': {'temperature': 0.1}}
+    # usageMetadata from the stub feeds the token counters
+    assert (tokens('m', 'prompt'), tokens('m', 'output')) == (before[0] + 100, before[1] + 6)
+
+
+def test_error_status_raises_llm_error(monkeypatch):
+    seen = []
+    client = LLMClient(api_key='k', base_url='http://stub', api_version='v1beta/missing',
+                       transport=recording_stub(monkeypatch, seen))
+    labels = {'model': 'm', 'stage': 'none', 'outcome': 'http_404'}
+    before = REGISTRY.get_sample_value('reporeleaf_llm_requests_total', labels) or 0
+
+    with pytest.raises(LLMError, match='404'):
+        asyncio.run(client.generate('p', 'm'))
+    assert REGISTRY.get_sample_value('reporeleaf_llm_requests_total', labels) == before + 1
+
+
+def test_each_event_loop_gets_a_pool_closed_when_the_loop_ends(monkeypatch):
+    client = LLMClient(api_key='k', base_url='http://stub', transport=recording_stub(monkeypatch, []))
+    pools = []
+
+    async def run():
+        await client.generate('p', 'm')
+        await client.generate('p', 'm')
+        pools.append(client._client())
+
+    asyncio.run(run())
+    asyncio.run(run())
+    assert pools[0] is not pools[1]
+    assert all(pool.is_closed for pool in pools)
+    assert client._clients == {}
@@ -0,0 +1,51 @@
+import gzip
+import random
+
+import pytest
+
+import parser
+from cache import DiskCache
+from scanner import scan_repo
+
+brotli = pytest.importorskip('brotli')
+
+
+def entry_for(tmp_path, name, data):
+    (tmp_path / name).write_bytes(data)
+    return next(e for e in scan_repo(str(tmp_path)) if e.rel_path == name)
+
+
+def noisy(n):
+    rng = random.Random(0)
+    return ''.join(rng.choice('abcdefghij \n{}();') for _ in range(n)).encode()
+
+
+def test_precompressed_formats_count_at_raw_size(tmp_path, monkeypatch):
+    monkeypatch.setattr(parser, 'ESTIMATE_BROTLI', True)
+    entry = entry_for(tmp_path, 'photo.jpg', b'\xff\xd8' + b'\0' * 5000)
+    assert parser.compressed_size(entry) == {'gzip': 5002, 'brotli': 5002}
+
+
+def test_streamed_sizes_match_one_shot_compression(tmp_path, monkeypatch):
+    monkeypatch.setattr(parser, 'COMPRESS_CHUNK_SIZE', 1000)
+    monkeypatch.setattr(parser, 'ESTIMATE_BROTLI', True)
+    data = noisy(10_500)
+    entry = entry_for(tmp_path, 'app.js', data)
+    sizes = parser.compressed_size(entry)
+    assert abs(sizes['gzip'] - len(gzip.compress(data, parser.GZIP_LEVEL))) <= 16
+    assert 0 < sizes['brotli'] <= len(brotli.compress(data, quality=parser.BROTLI_QUALITY)) + 16
+    assert sizes['brotli'] < len(data)
+
+
+def test_size_cache_follows_compression_settings(tmp_path, monkeypatch):
+    monkeypatch.setattr(parser, 'analysis_cache', DiskCache(str(tmp_path / 'ac.db'), 1 << 24))
+    repo = tmp_path / 'repo'
+    repo.mkdir()
+    (repo / 'app.js').write_bytes(noisy(20_000))
+
+    warm = parser.file_sizes(scan_repo(str(repo)))['app.js']
+    assert warm['brotli'] is None
+    monkeypatch.setattr(parser, 'ESTIMATE_BROTLI', True)
+    assert parser.file_sizes(scan_repo(str(repo)))['app.js']['brotli'] is not None
+    monkeypatch.setattr(parser, 'GZIP_LEVEL', 1)
+    assert parser.file_sizes(scan_repo(str(repo)))['app.js']['gzip'] != warm['gzip']
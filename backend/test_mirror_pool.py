@@ -0,0 +1,133 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from git import Repo
+
+from mirror_pool import MirrorPool, normalize_repo_url, resolve_commit, valid_ref
+
+
+def make_remote(tmp_path):
+    """A bare repo reachable over file:// with one commit on main."""
+    work = Repo.init(str(tmp_path / 'work'), initial_branch='main')
+    with work.config_writer() as cfg:
+        cfg.set_value('user', 'name', 'test')
+        cfg.set_value('user', 'email', 'test@example.com')
+    commit_file(work, 'index.html', '<html>v1</html>')
+    bare = tmp_path / 'remote.git'
+    Repo.clone_from(work.working_dir, str(bare), bare=True)
+    Repo(str(bare)).git.config('uploadpack.allowFilter', 'true')
+    work.create_remote('origin', str(bare))
+    return work, f'file://{bare}'
+
+
+def commit_file(repo, rel_path, content):
+    with open(os.path.join(repo.working_dir, rel_path), 'w') as f:
+        f.write(content)
+    repo.index.add([rel_path])
+    return repo.index.commit(f'update {rel_path}').hexsha
+
+
+def test_checkout_reuses_mirror_and_sees_new_commits(tmp_path):
+    work, url = make_remote(tmp_path)
+    pool = MirrorPool(str(tmp_path / 'mirrors'), max_bytes=1 << 30)
+
+    first = str(tmp_path / 'checkout-1')
+    sha = pool.checkout(url, first)
+    assert sha == work.head.commit.hexsha
+    assert open(os.path.join(first, 'index.html')).read() == '<html>v1</html>'
+    mirror = pool.mirror_path(url)
+    assert Repo(mirror).git.rev_parse('--is-shallow-repository') == 'true'
+
+    new_sha = commit_file(work, 'index.html', '<html>v2</html>')
+    work.remote('origin').push('main')
+
+    second = str(tmp_path / 'checkout-2')
+    assert pool.checkout(url, second) == new_sha
+    assert pool.mirror_path(url) == mirror
+    assert open(os.path.join(second, 'index.html')).read() == '<html>v2</html>'
+
+    pool.release(first)
+    pool.release(second)
+    assert not os.path.exists(first)
+    assert not os.path.exists(second)
+    assert os.path.isdir(mirror)
+
+
+def test_evict_drops_unused_mirrors_over_budget(tmp_path):
+    _, url = make_remote(tmp_path)
+    pool = MirrorPool(str(tmp_path / 'mirrors'), max_bytes=1 << 30)
+    dest = str(tmp_path / 'checkout')
+    pool.checkout(url, dest)
+
+    pool.max_bytes = 0
+    pool.evict()
+    assert os.path.isdir(pool.mirror_path(url))  # still checked out
+
+    pool.release(dest)
+    pool.evict()
+    assert not os.path.exists(pool.mirror_path(url))
+
+
+def test_changed_paths_between_fetched_refs(tmp_path):
+    work, url = make_remote(tmp_path)
+    base_sha = work.head.commit.hexsha
+    work.git.checkout('-b', 'feature')
+    commit_file(work, 'app.js', 'export const x = 1')
+    commit_file(work, 'index.html', '<html>v2</html>')
+    work.git.rm('-q', 'index.html')
+    work.index.commit('drop index.html')
+    work.remote('origin').push('feature')
+
+    pool = MirrorPool(str(tmp_path / 'mirrors'), max_bytes=1 << 30)
+    _, base = pool.fetch(url, 'main')
+    _, head = pool.fetch(url, 'feature')
+
+    assert base == base_sha
+    assert pool.changed_paths(url, base, head) == {'app.js': 'A', 'index.html': 'D'}
+
+
+def test_spellings_of_one_repo_share_a_mirror_and_its_lock(tmp_path):
+    work, url = make_remote(tmp_path)
+    main_sha = work.head.commit.hexsha
+    work.git.checkout('-b', 'feature')
+    feature_sha = commit_file(work, 'app.js', 'export const x = 1')
+    work.remote('origin').push('feature')
+    other = url[:-len('.git')] + '.git/'
+
+    pool = MirrorPool(str(tmp_path / 'mirrors'), max_bytes=1 << 30)
+    assert pool.mirror_path(other) == pool.mirror_path(url)
+    assert pool._url_lock(other) is pool._url_lock(url)
+
+    # Interleaved fetches of different refs must each see their own FETCH_HEAD
+    jobs = [(url, 'main'), (other, 'feature')] * 4
+    with ThreadPoolExecutor(max_workers=len(jobs)) as ex:
+        shas = list(ex.map(lambda job: pool.fetch(*job)[1], jobs))
+    assert shas == [main_sha, feature_sha] * 4
+    assert len(os.listdir(tmp_path / 'mirrors')) == 1
+
+
+def test_repo_urls_normalize_and_resolve_remotely(tmp_path):
+    assert normalize_repo_url('https://GitHub.com/Owner/Repo.git/') == 'github.com/owner/repo'
+    assert normalize_repo_url('http://github.com/owner/repo') == 'github.com/owner/repo'
+
+    work, url = make_remote(tmp_path)
+    assert resolve_commit(url) == work.head.commit.hexsha
+    assert resolve_commit(url, 'main') == work.head.commit.hexsha
+    assert resolve_commit(url, 'A' * 40) == 'a' * 40
+
+
+def test_refs_that_look_like_options_are_rejected(tmp_path):
+    work, url = make_remote(tmp_path)
+    pool = MirrorPool(str(tmp_path / 'mirrors'), max_bytes=1 << 30)
+    pool.fetch(url)
+    marker = tmp_path / 'PWNED'
+    for ref in (f'--upload-pack=touch {marker};git-upload-pack', '-h', 'a..b', 'bad ref'):
+        assert not valid_ref(ref)
+        with pytest.raises(ValueError):
+            pool.fetch(url, ref)
+        with pytest.raises(ValueError):
+            resolve_commit(url, ref)
+    assert not marker.exists()
+    assert valid_ref('main') and valid_ref('feature/x') and valid_ref(work.head.commit.hexsha)
+    assert pool.fetch(url, 'main')[1] == work.head.commit.hexsha
@@ -0,0 +1,55 @@
+import asyncio
+
+import server
+from regions import locate_regions, parse_regions, splice_regions, still_parses
+
+FILLER = ''.join(f'export const c{i} = {i}\n' for i in range(300))
+HOT = 'function hot(xs) {\n  for (const a of xs) {\n    for (const b of xs) { use(a, b) }\n  }\n}\n'
+
+
+def test_nested_loop_region_is_the_enclosing_function():
+    content = FILLER + HOT + FILLER
+    assert locate_regions(content, '.js', ['NestedLoop']) == [(300, 305)]
+    # Whole-file findings can't be scoped to a region
+    assert locate_regions(content, '.js', ['NestedLoop', 'NoCodeSplitting']) is None
+
+
+def test_html_regions_are_merged_per_line():
+    html = ('<html><head>\n<title>x</title>\n</head><body>\n'
+            '<img src="a.png"> <img src="b.png" loading="lazy">\n<p>text</p>\n'
+            '<img src="c.png">\n</body></html>\n')
+    assert locate_regions(html, '.html', ['MissingLazyLoading']) == [(3, 4), (5, 6)]
+    assert locate_regions(html, '.html', ['MissingCachePolicy', 'NonResponsiveImage']) == \
+        [(0, 4), (5, 6)]
+
+
+def test_splice_replaces_only_the_regions():
+    content = 'a\nb\nc\nd\n'
+    reply = '<<<REGION 1>>>\n```js\nB\n```\n<<<END REGION 1>>>\n<<<REGION 2>>>\nD1\nD2\n<<<END REGION 2>>>'
+    assert splice_regions(content, [(1, 2), (3, 4)], parse_regions(reply)) == 'a\nB\nc\nD1\nD2\n'
+
+
+def test_region_rewrite_is_validated_and_falls_back(monkeypatch):
+    content = FILLER + HOT + FILLER
+    regions = locate_regions(content, '.js', ['NestedLoop'])
+    prompts = []
+
+    def reply_with(body):
+        async def fake(prompt):
+            prompts.append(prompt)
+            return f'<<<REGION 1>>>\n{body}\n<<<END REGION 1>>>'
+        monkeypatch.setattr(server, 'generate_codegen_text', fake)
+
+    async def run():
+        return await server.generate_region_code(content, '.js', [{'type': 'NestedLoop'}], regions)
+
+    reply_with('function hot(xs) {\n  const s = new Set(xs)\n  for (const a of s) use(a, a)\n}')
+    optimized = asyncio.run(run())
+    assert optimized == FILLER + 'function hot(xs) {\n  const s = new Set(xs)\n' \
+        '  for (const a of s) use(a, a)\n}\n' + FILLER
+    # Only the region and its context went to the model
+    assert 'c299 = 299' in prompts[0] and 'c200 = 200' not in prompts[0]
+
+    reply_with('function hot(xs) {\n  for (const a of xs) {')
+    assert asyncio.run(run()) is None
+    assert not still_parses('.js', content, content.replace(HOT, HOT[:-3]))
@@ -0,0 +1,44 @@
+from rules import RULES, Rule, rule_timings, run_js_rules
+
+
+def issue_types(content):
+    return {i['type'] for i in run_js_rules(content)}
+
+
+def test_rules_understand_modules_and_jsx():
+    nested = '''
+import { api } from './api'
+export default function List({ rows }) {
+  for (const row of rows) { rows.forEach(() => { while (row.next) row = row.next }) }
+  return <ul>{rows.map(r => <li key={r.id}>{r.name}</li>)}</ul>
+}
+'''
+    assert issue_types(nested) == {'NestedLoop', 'NoCodeSplitting'}
+
+    split = "export const load = () => import('./page')\nfor (;;) {}"
+    assert issue_types(split) == {'UnusedJavaScript'}
+
+
+def test_typescript_falls_back_to_source_heuristics():
+    ts = 'export function f(xs: number[]): number {\n  for (const x of xs) {\n    while (x) { }\n  }\n  return 0\n}'
+    assert issue_types(ts) == {'NestedLoop', 'NoCodeSplitting', 'UnusedJavaScript'}
+    assert 'NestedLoop' not in issue_types('let a: number = 1\nfor (;;) { }\nfor (;;) { }')
+
+
+def test_new_rules_join_the_same_traversal():
+    class ConsoleRule(Rule):
+        type = 'ConsoleLog'
+
+        def __init__(self):
+            self.seen = False
+
+        def enter_MemberExpression(self, node):
+            if getattr(node.object, 'name', None) == 'console':
+                self.seen = True
+
+        def finish(self):
+            return self.seen
+
+    issues = run_js_rules('console.log(1)', rules=RULES + [ConsoleRule])
+    assert 'ConsoleLog' in {i['type'] for i in issues}
+    assert rule_timings()['ConsoleLog']['files'] >= 1
@@ -0,0 +1,61 @@
+import os
+
+from parser import llm_check_prompt, merge_llm_verdicts
+from sampling import CHARS_PER_TOKEN, TRUNCATED_MARKER, estimate_tokens, pack_samples, rank_files
+from scanner import scan_repo
+
+CODE_EXTS = ('.js', '.jsx', '.ts', '.tsx', '.css', '.html')
+
+
+def write(root, rel_path, content):
+    path = os.path.join(root, rel_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(content)
+
+
+def test_ranking_prefers_entry_points_and_shipped_assets(tmp_path):
+    root = str(tmp_path)
+    write(root, 'index.html', '<script type="module" src="/src/boot.js"></script>')
+    write(root, 'src/boot.js', 'start()\n')
+    write(root, 'src/App.jsx', 'export default () => null\n' * 10)
+    write(root, 'src/lib/helpers.js', 'x\n' * 400)
+    write(root, 'src/lib/helpers.test.js', 'x\n' * 4000)
+    write(root, 'src/empty.js', '')
+    ranked = [e.rel_path for e in rank_files(scan_repo(root), CODE_EXTS)]
+    assert ranked.index('src/boot.js') < ranked.index('src/lib/helpers.js')
+    assert ranked.index('src/App.jsx') < ranked.index('src/lib/helpers.js')
+    assert ranked[-1] == 'src/lib/helpers.test.js'
+    assert 'src/empty.js' not in ranked
+
+
+def test_batches_fit_the_token_budget(tmp_path):
+    root = str(tmp_path)
+    for i in range(30):
+        write(root, f'src/f{i}.js', f'const v{i} = 1\n' * 60 * (i % 5 + 1))
+    write(root, 'src/big.js', 'const big = 1\n' * 5000)
+    batches = pack_samples(scan_repo(root), CODE_EXTS, overhead_tokens=200,
+                           prompt_tokens=2000, max_prompts=3, file_max_tokens=800)
+    assert 1 < len(batches) <= 3
+    for batch in batches:
+        assert estimate_tokens(len(llm_check_prompt(batch))) <= 2000 + 200
+    samples = {s['path']: s['content'] for b in batches for s in b}
+    # Oversized files are cut at a line boundary rather than skipped
+    assert samples['src/big.js'].endswith(TRUNCATED_MARKER)
+    assert len(samples['src/big.js']) <= 800 * CHARS_PER_TOKEN
+    # More files than fit: the budget, not the file count, limits coverage
+    assert len(samples) < 31
+
+
+def test_verdicts_are_merged_across_batches():
+    responses = [
+        [{'type': 'Reduce DOM size', 'compliant': False},
+         {'type': 'Avoid long tasks', 'compliant': True}],
+        None,
+        [{'type': 'Reduce DOM size', 'compliant': False},
+         {'type': 'Avoid long tasks', 'compliant': False}, 'junk'],
+    ]
+    assert merge_llm_verdicts(responses) == [
+        {'type': 'Reduce DOM size', 'file': None},
+        {'type': 'Avoid long tasks', 'file': None},
+    ]
@@ -0,0 +1,81 @@
+import os
+
+from scanner import scan_repo
+
+
+def write(root, rel_path, content=''):
+    path = os.path.join(root, rel_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(content)
+
+
+def test_scan_repo_prunes_and_honours_gitignore(tmp_path):
+    root = str(tmp_path)
+    write(root, '.gitignore', 'dist/\n*.log\n!keep.log\n/secret.txt\n')
+    write(root, 'src/app.js', 'console.log(1)')
+    write(root, 'src/styles.css', '.a {}')
+    write(root, 'src/debug.log', 'noise')
+    write(root, 'src/keep.log', 'kept')
+    write(root, 'src/secret.txt', 'not anchored at root')
+    write(root, 'secret.txt', 'anchored')
+    write(root, 'dist/bundle.js', 'built')
+    write(root, 'node_modules/pkg/index.js', 'dep')
+    write(root, '.git/HEAD', 'ref')
+
+    index = scan_repo(root)
+    paths = sorted(e.rel_path.replace(os.sep, '/') for e in index)
+
+    assert paths == ['.gitignore', 'src/app.js', 'src/keep.log',
+                     'src/secret.txt', 'src/styles.css']
+    assert [e.rel_path for e in index.by_ext['.js']] == [os.path.join('src', 'app.js')]
+    assert [e.rel_path for e in index.with_ext('.css', '.js', '.css', '.png')] == \
+        [os.path.join('src', 'styles.css'), os.path.join('src', 'app.js')]
+
+
+def test_changed_paths_follow_the_same_ignore_rules(tmp_path):
+    root = str(tmp_path)
+    write(root, '.gitignore', 'dist/\n')
+    write(root, 'src/.gitignore', '*.gen.js\n')
+    write(root, 'src/a.js', 'a')
+    write(root, 'src/b.gen.js', 'generated')
+    write(root, 'dist/b.js', 'built')
+    write(root, 'node_modules/pkg/index.js', 'dep')
+    changed = ['src/a.js', 'src/b.gen.js', 'dist/b.js', 'node_modules/pkg/index.js']
+
+    index = scan_repo(root, only_paths=changed)
+    assert [e.rel_path.replace(os.sep, '/') for e in index] == ['src/a.js']
+
+
+def test_incremental_metrics_match_a_full_run(tmp_path, monkeypatch):
+    import parser
+    from cache import DiskCache
+    monkeypatch.setattr(parser, 'analysis_cache', DiskCache(str(tmp_path / 'ac.db'), 1 << 24))
+    root = str(tmp_path / 'repo')
+    write(root, '.gitignore', 'dist/\n')
+    write(root, 'src/a.js', 'const a = 1\n' * 50)
+    write(root, 'src/old.css', '.x {}')
+    parser.compute_metrics(scan_repo(root), 'repo', 'base')
+
+    # Head edits a file, removes one, adds one and rebuilds ignored output
+    write(root, 'src/a.js', 'const a = 2\n' * 80)
+    os.remove(os.path.join(root, 'src/old.css'))
+    write(root, 'src/new.html', '<p>hi</p>')
+    write(root, 'dist/bundle.js', 'x' * 5000)
+    write(root, 'node_modules/dep/index.js', 'y' * 5000)
+    changed = {'src/a.js': 'M', 'src/old.css': 'D', 'src/new.html': 'A',
+               'dist/bundle.js': 'A', 'node_modules/dep/index.js': 'A'}
+    index = scan_repo(root, only_paths=[p for p, s in changed.items() if s != 'D'])
+    incremental = parser.compute_metrics_incremental(index, changed, 'repo', 'base', 'head')
+    assert incremental == parser.compute_metrics(scan_repo(root))
+
+
+def test_file_entry_loads_bytes_lazily(tmp_path):
+    root = str(tmp_path)
+    write(root, 'index.html', '<html></html>')
+
+    entry = scan_repo(root).files[0]
+    assert entry._data is None
+    assert entry.size == 13
+    assert entry.read_text() == '<html></html>'
+    assert entry._data == b'<html></html>'
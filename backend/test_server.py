@@ -0,0 +1,150 @@
+import asyncio
+import gzip
+import json
+import os
+
+from fastapi.testclient import TestClient
+
+import server
+from events import sse_event
+from jobs import JobManager
+
+client = TestClient(server.app)
+
+
+def test_option_like_refs_are_rejected_before_git_runs(tmp_path):
+    marker = tmp_path / 'PWNED'
+    for params in ({'base': f'--upload-pack=touch {marker};git-upload-pack'},
+                   {'head': '--upload-pack=touch ' + str(marker)},
+                   {'base': 'a..b'}):
+        response = client.post('/jobs', params={'github_url': 'file:///nonexistent.git', **params})
+        assert response.status_code == 400
+    assert client.post('/jobs', params={'github_url': '--upload-pack=x'}).status_code == 400
+    assert not marker.exists()
+
+
+def test_failed_analysis_ends_with_a_failed_event(tmp_path):
+    async def run():
+        return [m async for m in server.analysis_generator(f'file://{tmp_path}/missing.git')]
+
+    messages = asyncio.run(run())
+    assert messages[-1].startswith('event: failed\n')
+    assert not any(m.startswith('event: done') for m in messages)
+
+
+def test_analyses_of_one_commit_are_coalesced(tmp_path, monkeypatch):
+    monkeypatch.setattr(server, 'job_manager', JobManager(str(tmp_path)))
+    monkeypatch.setattr(server, 'resolve_commit', lambda url, ref=None: 'c' * 40)
+    runs = []
+
+    async def fake_analysis(github_url, refresh=False, base=None, head=None, payload='diff'):
+        run = {'refresh': refresh, 'gate': asyncio.Event(), 'fail': False}
+        runs.append(run)
+        await run['gate'].wait()
+        if run['fail']:
+            yield sse_event('failed', {'message': 'boom'})
+        else:
+            yield sse_event('done', {})
+
+    monkeypatch.setattr(server, 'analysis_generator', fake_analysis)
+    start = server.start_analysis_job
+
+    async def finish(n, job, fail=False):
+        while len(runs) <= n:
+            await asyncio.sleep(0)
+        runs[n]['fail'] = fail
+        runs[n]['gate'].set()
+        await job.task
+
+    async def scenario():
+        first = await start('https://github.com/Owner/Repo')
+        # A second viewer joins the running job, whatever the URL spelling
+        assert await start('https://github.com/owner/repo.git') is first
+        await finish(0, first)
+
+        # A finished result is reused within ANALYSIS_RESULT_TTL...
+        assert await start('https://github.com/owner/repo') is first
+        # ...unless the caller asks for a fresh one
+        fresh = await start('https://github.com/owner/repo', refresh=True)
+        assert fresh is not first
+        await finish(1, fresh, fail=True)
+        assert runs[1]['refresh'] and fresh.failed
+
+        # A failed job is never reused, and neither is one past the TTL
+        retry = await start('https://github.com/owner/repo')
+        assert retry not in (first, fresh)
+        await finish(2, retry)
+        retry.finished_at -= server.ANALYSIS_RESULT_TTL + 1
+        expired = await start('https://github.com/owner/repo')
+        assert expired is not retry
+        await finish(3, expired)
+
+    asyncio.run(scenario())
+    assert len(runs) == 4
+
+
+def test_job_events_resume_from_any_last_event_id_spelling():
+    job_id = 'f' * 32
+    with open(os.path.join(server.job_manager.jobs_dir, f'{job_id}.jsonl'), 'w') as f:
+        for n, msg in enumerate(['data: one\n\n', 'data: two\n\n', 'event: done\ndata: {}\n\n']):
+            f.write(json.dumps({'id': n, 'msg': msg}) + '\n')
+        f.write(json.dumps({'done': True}) + '\n')
+    url = f'/jobs/{job_id}/events'
+
+    assert client.get(url).text.startswith('id: 0\ndata: one')
+    expected = 'id: 2\nevent: done\ndata: {}\n\n'
+    assert client.get(url, headers={'Last-Event-ID': '1'}).text == expected
+    assert client.get(url, params={'last_event_id': 1}).text == expected
+    # event-source-polyfill's default reconnect parameter
+    assert client.get(url, params={'lastEventId': 1}).text == expected
+    assert client.get('/jobs/' + '0' * 31 + 'x/events').status_code == 404
+
+
+def test_save_files_accepts_gzip_json():
+    body = gzip.compress(json.dumps({'files': [{'path': 'src/a.js', 'content': 'a'},
+                                               {'path': 'b.css', 'content': 'b'}]}).encode())
+    response = client.post('/save-files', params={'session_id': 'gz'}, content=body,
+                           headers={'Content-Type': 'application/json', 'Content-Encoding': 'gzip'})
+    assert response.json()['saved'] == 2
+    assert server.file_store.files('gz') == [('b.css', 'b'), ('src/a.js', 'a')]
+
+
+def test_save_files_accepts_ndjson():
+    lines = [json.dumps({'path': f'f{i}.js', 'content': str(i)}) for i in range(3)]
+    response = client.post('/save-files', params={'session_id': 'nd'},
+                           content='\n'.join(lines) + '\n',
+                           headers={'Content-Type': 'application/x-ndjson'})
+    assert response.json()['saved'] == 3
+    assert server.file_store.files('nd')[0] == ('f0.js', '0')
+
+
+def test_save_files_refuses_oversized_bodies(monkeypatch):
+    monkeypatch.setattr(server, 'SAVE_MAX_BYTES', 64)
+    files = json.dumps({'files': [{'path': 'a.js', 'content': 'x' * 100}]}).encode()
+    params = {'session_id': 'big'}
+
+    assert client.post('/save-files', params=params, content=files).status_code == 413
+    # No Content-Length: the limit applies while the body streams in
+    chunked = client.post('/save-files', params=params, content=iter([files[:50], files[50:]]))
+    assert chunked.status_code == 413
+    # Small on the wire, too large once inflated
+    bomb = client.post('/save-files', params=params, content=gzip.compress(files),
+                       headers={'Content-Encoding': 'gzip'})
+    assert bomb.status_code == 413
+    assert server.file_store.files('big') == []
+
+
+def test_save_files_refuses_unknown_encodings():
+    response = client.post('/save-files', params={'session_id': 'br'}, content=b'{}',
+                           headers={'Content-Encoding': 'br'})
+    assert response.status_code == 415
+
+
+def test_metrics_endpoint_exports_prometheus_text():
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/plain')
+    for name in ('reporeleaf_stage_seconds', 'reporeleaf_llm_requests_total',
+                 'reporeleaf_active_jobs', 'reporeleaf_cache_hits'):
+        assert f'# TYPE {name}' in response.text
+    assert 'reporeleaf_cache_hits_total{cache="analysis"}' in response.text
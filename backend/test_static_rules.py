@@ -0,0 +1,83 @@
+import base64
+import hashlib
+import os
+
+import parser
+from parser import (build_class_index, check_guidelines_static, class_name_tokens,
+                    css_class_selectors)
+from scanner import scan_repo
+
+
+def write(root, rel_path, content):
+    path = os.path.join(root, rel_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(content)
+
+
+def test_class_tokens_cover_markup_jsx_and_templates():
+    assert class_name_tokens('<div class="card card--wide" id=x class=plain>') >= \
+        {'card', 'card--wide', 'plain'}
+    jsx = 'const A = () => <b className={`btn ${on ? "btn-on" : ""}`}>{cn(\'icon\')}</b>'
+    assert class_name_tokens(jsx) >= {'btn', 'btn-on', 'icon'}
+    # Text outside strings is not a reference
+    assert 'hidden' not in class_name_tokens('<p>hidden</p>')
+
+
+def test_css_selectors_include_compound_classes():
+    css = ('div.card {} .a.b:hover {} li.active > a.link {}\n'
+           '.bg { background: url(img/foo.png); margin: .5em 0.25em }\n'
+           '@media (min-width: 40.5em) { .wide.card {} }\n'
+           '/* .commented */ [title="x.y"] {}')
+    assert css_class_selectors(css) == ['card', 'a', 'b', 'active', 'link', 'bg', 'wide', 'card']
+
+
+def test_unused_css_counts_compound_selectors(tmp_path):
+    root = str(tmp_path)
+    write(root, 'index.html', '<div class="layout"></div>')
+    write(root, 'src/app.css', '.layout {} div.panel {} .panel.open {} li.item {}')
+
+    unused = {i['file'] for i in check_guidelines_static(scan_repo(root), global_checks=False)
+              if i['type'] == 'UnusedCSS'}
+    assert unused == {'src/app.css'}
+
+
+def test_unused_css_sees_jsx_class_names(tmp_path):
+    root = str(tmp_path)
+    write(root, 'index.html', '<div class="layout"></div>')
+    write(root, 'src/App.tsx', 'export const App = () => <main className="hero card" />')
+    write(root, 'src/app.css', '.layout {} .hero {} .card { margin: 0.5em }')
+    write(root, 'src/legacy.css', '.layout {} .old-a {} .old-b {}')
+
+    index = scan_repo(root)
+    assert build_class_index(index) >= {'layout', 'hero', 'card'}
+    unused = {i['file'] for i in check_guidelines_static(index, global_checks=False)
+              if i['type'] == 'UnusedCSS'}
+    assert unused == {'src/legacy.css'}
+
+
+def test_process_pool_matches_in_process_checks(tmp_path, monkeypatch):
+    root = str(tmp_path)
+    loops = 'for (let i = 0; i < n; i++) {\r\n  for (let j = 0; j < n; j++) { f(i, j) }\r\n}\r\n'
+    write(root, 'src/loops.js', loops)
+    write(root, 'index.html', '<html>\r\n<img src="a.png">\r\n</html>\r\n')
+    with open(os.path.join(root, 'src/bad.js'), 'wb') as f:
+        f.write(b'const s = "\xff\xfe"\r\nfor (const a of b) { for (const c of a) {} }\r')
+    # Compresses just under the UncompressedJS threshold with CRLFs, just over without
+    noise = '\r\n'.join(base64.b64encode(hashlib.sha256(b'%d' % i).digest()).decode()[:4]
+                        for i in range(400))
+    write(root, 'src/noise.js', noise)
+    entries = sorted(scan_repo(root), key=lambda e: e.rel_path)
+
+    monkeypatch.setattr(parser, 'STATIC_WORKERS', 0)
+    in_process = parser.run_static_file_checks(entries)
+    monkeypatch.setattr(parser, 'STATIC_WORKERS', 2)
+    monkeypatch.setattr(parser, 'STATIC_POOL_MIN_FILES', 1)
+    monkeypatch.setattr(parser, '_static_pool', None)
+    try:
+        pooled = parser.run_static_file_checks(entries)
+    finally:
+        parser._static_pool.shutdown()
+
+    assert pooled == in_process
+    assert all(in_process)
@@ -0,0 +1,42 @@
+import threading
+
+from storage import FileStore, normalize_file_path, valid_session_id
+
+
+def test_sessions_do_not_see_or_clear_each_other(tmp_path):
+    store = FileStore(str(tmp_path / 'files.db'))
+    assert store.save_many('alice', [('a.js', 'a1'), ('b.js', 'b1')]) == 2
+    store.save('bob', 'a.js', 'bob')
+    store.save('alice', 'a.js', 'a2')
+
+    assert store.files('alice') == [('a.js', 'a2'), ('b.js', 'b1')]
+    store.clear('alice')
+    assert store.files('alice') == []
+    assert store.files('bob') == [('a.js', 'bob')]
+
+
+def test_threads_share_the_database(tmp_path):
+    store = FileStore(str(tmp_path / 'files.db'))
+    threads = [threading.Thread(target=store.save, args=(f's{i}', 'x.js', str(i)))
+               for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert all(store.files(f's{i}') == [('x.js', str(i))] for i in range(8))
+
+
+def test_prune_and_session_ids(tmp_path):
+    store = FileStore(str(tmp_path / 'files.db'), retention=-1)
+    store.save('s', 'x.js', '1')
+    assert store.prune() == 1
+    assert valid_session_id('3f2b1c9e-0d4a-4e6b-9a51-2c7d8e9f0a1b')
+    assert not valid_session_id('../etc')
+    assert not valid_session_id('')
+
+
+def test_file_paths_stay_inside_the_checkout():
+    assert normalize_file_path('./src/app.js') == 'src/app.js'
+    assert normalize_file_path('src/../index.html') == 'index.html'
+    for bad in ['', '/etc/passwd', '../x.js', 'src/../../x.js', '.git/config', 'a\\b.js', 'a\0.js']:
+        assert normalize_file_path(bad) is None, bad
@@ -0,0 +1,46 @@
+import asyncio
+
+from prometheus_client import REGISTRY
+
+from telemetry import current_stage, span, start_timings, timed
+
+
+def test_spans_accumulate_into_the_analysis_timings():
+    async def analysis():
+        timings = start_timings()
+        with span('index'):
+            await asyncio.sleep(0.01)
+        with span('enrich'):
+            # Tasks and threads started inside a span see its stage and timings
+            stage = await asyncio.create_task(asyncio.to_thread(current_stage.get))
+        with span('index'):
+            pass
+        return timings, stage
+
+    timings, stage = asyncio.run(analysis())
+    assert stage == 'enrich'
+    assert set(timings) == {'index', 'enrich'}
+    assert timings['index'] >= 0.01
+    assert current_stage.get() == 'none'
+    assert REGISTRY.get_sample_value('reporeleaf_stage_seconds_count', {'stage': 'index'}) >= 2
+
+
+def test_timed_counts_the_producer_but_not_the_consumer():
+    async def producer():
+        for n in range(3):
+            await asyncio.sleep(0.01)
+            yield n, current_stage.get()
+
+    async def analysis():
+        timings = start_timings()
+        seen = []
+        async for item in timed('codegen', producer()):
+            seen.append(item)
+            assert current_stage.get() == 'none'
+            # A slow consumer, e.g. a client applying back-pressure
+            await asyncio.sleep(0.1)
+        return timings, seen
+
+    timings, seen = asyncio.run(analysis())
+    assert seen == [(0, 'codegen'), (1, 'codegen'), (2, 'codegen')]
+    assert 0.03 <= timings['codegen'] < 0.1
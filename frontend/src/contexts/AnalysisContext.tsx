@@ -10,6 +10,8 @@ type FileEntry = {
 };
 
 interface AnalysisData {
+  // Scopes saved edits on the server so concurrent users don't clobber each other
+  sessionId: string;
   repoUrl: string | null; 
   carbon: string | null;
   issues: Issue[];
@@ -32,13 +34,14 @@ export function useAnalysis() {
 }
 
 export function AnalysisProvider({ children }: { children: ReactNode }) {
-  const [analysisData, setAnalysisDataState] = useState<AnalysisData>({
+  const [analysisData, setAnalysisDataState] = useState<AnalysisData>(() => ({
+    sessionId: crypto.randomUUID(),
     repoUrl: null,
     carbon: null,
     issues: [],
     metrics: null,
     files: [],
-  });
+  }));
 
   const setAnalysisData = (data: Partial<AnalysisData>) => {
     setAnalysisDataState((prev) => ({ ...prev, ...data }));
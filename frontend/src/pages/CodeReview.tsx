@@ -9,17 +9,12 @@ import { useCodeChanges } from "../contexts/CodeChangesContext";
 import "diff2html/bundles/css/diff2html.min.css";
 import "../styles/CodeReview.css";
 
-// Helper to decode \n
-function decodeNewlines(text: string) {
-  return text.replace(/\\n/g, "\n").replace(/\\"/g, '"');
-}
-
 const API_BASE_URL = import.meta.env.VITE_API_URL;
 
 export default function CodeReviewPage() {
   const navigate = useNavigate();
-  const { files, repoUrl } = useAnalysis();
-  const { addFinalizedFile } = useCodeChanges();
+  const { files, repoUrl, sessionId } = useAnalysis();
+  const { finalizedFiles, addFinalizedFile } = useCodeChanges();
 
   const [currentFileIndex, setCurrentFileIndex] = useState(0);
   const [showFullScreen, setShowFullScreen] = useState(false);
@@ -45,58 +40,60 @@ export default function CodeReviewPage() {
   const diffString = createTwoFilesPatch(
     currentFile.filename,
     currentFile.filename,
-    decodeNewlines(currentFile.original.trim()),
-    decodeNewlines(currentFile.optimized.trim()),
+    currentFile.original,
+    currentFile.optimized,
     "",
     "",
     { context: 3 }
   );
 
-  const saveFileToServer = async (filePath: string, content: string) => {
-    try {
-      const params = new URLSearchParams({
-        file_path: filePath,
-        content: content,
-      });
-
-      const response = await fetch(
-        `${API_BASE_URL}save-file?${params.toString()}`,
-        {
-          method: "POST",
-          headers: {
-            "Content-Type": "application/json",
-          },
-        }
-      );
-
-      if (!response.ok) throw new Error("Failed to save file");
-      console.log(`✅ Saved ${filePath} successfully with query parameters`);
-    } catch (err) {
-      console.error("Error saving file:", err);
+  // All reviewed files go up in one gzip-compressed request right before branching
+  const saveFilesToServer = async (
+    filesToSave: { filename: string; content: string }[]
+  ) => {
+    const json = JSON.stringify({
+      files: filesToSave.map(({ filename, content }) => ({
+        path: filename,
+        content,
+      })),
+    });
+    const headers: Record<string, string> = {
+      "Content-Type": "application/json",
+    };
+    let body: BodyInit = json;
+    if (typeof CompressionStream !== "undefined") {
+      const stream = new Blob([json])
+        .stream()
+        .pipeThrough(new CompressionStream("gzip"));
+      body = await new Response(stream).arrayBuffer();
+      headers["Content-Encoding"] = "gzip";
     }
+
+    const response = await fetch(
+      `${API_BASE_URL}save-files?session_id=${encodeURIComponent(sessionId)}`,
+      { method: "POST", headers, body }
+    );
+
+    if (!response.ok) throw new Error("Failed to save files");
+    console.log(`✅ Saved ${filesToSave.length} files`);
   };
 
-  const handleAcceptChanges = async () => {
+  const handleAcceptChanges = () => {
     console.log(`Accepted changes for file: ${currentFile.filename}`);
-    const optimizedContent = decodeNewlines(currentFile.optimized.trim());
-
-    await saveFileToServer(currentFile.filename, optimizedContent);
+    // Saved exactly as received: these contents end up in the branch
     addFinalizedFile({
       filename: currentFile.filename,
-      content: optimizedContent,
+      content: currentFile.optimized,
     });
 
     moveToNextFileOrFinish();
   };
 
-  const handleDeclineChanges = async () => {
+  const handleDeclineChanges = () => {
     console.log(`Kept original for file: ${currentFile.filename}`);
-    const originalContent = decodeNewlines(currentFile.original.trim());
-
-    await saveFileToServer(currentFile.filename, originalContent);
     addFinalizedFile({
       filename: currentFile.filename,
-      content: originalContent,
+      content: currentFile.original,
     });
 
     moveToNextFileOrFinish();
@@ -123,9 +120,13 @@ export default function CodeReviewPage() {
         return;
       }
 
+      await saveFilesToServer(finalizedFiles);
+
       const finalUrl = `${API_BASE_URL}create-branch?github_url=${encodeURIComponent(
         githubUrl
-      )}&installation_id=${encodeURIComponent(installationId)}`;
+      )}&installation_id=${encodeURIComponent(
+        installationId
+      )}&session_id=${encodeURIComponent(sessionId)}`;
       console.log("Calling create-branch with URL:", finalUrl);
 
       const response = await fetch(finalUrl, {
@@ -197,7 +198,7 @@ export default function CodeReviewPage() {
                 marginTop: "0",
               }}
             >
-              {decodeNewlines(currentFile.optimized.trim())}
+              {currentFile.optimized}
             </SyntaxHighlighter>
           </div>
 
@@ -276,7 +277,7 @@ export default function CodeReviewPage() {
                   marginTop: "0",
                 }}
               >
-                {decodeNewlines(currentFile.original.trim())}
+                {currentFile.original}
               </SyntaxHighlighter>
             )}
           </div>
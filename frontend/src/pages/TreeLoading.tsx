@@ -1,6 +1,7 @@
 import { useEffect, useState } from "react";
 import { useNavigate } from "react-router-dom";
 import { EventSourcePolyfill } from "event-source-polyfill";
+import { applyPatch } from "diff";
 import { useAnalysis } from "../contexts/AnalysisContext";
 import "../styles/TreeLoading.css";
 
@@ -24,17 +25,19 @@ const stageHeadings = [
 
 const stageDurations = [10000, 20000, 15000, 20000, 25000, 20000];
 
-// ✨ Helper to safely extract code field
-const extractCode = (value: string) => {
-  const match = value.match(/['"]code['"]\s*:\s*['"]([\s\S]*?)['"]\s*}$/);
-  if (match) {
-    return match[1]
-      .replace(/\\n/g, "\n")
-      .replace(/\\"/g, '"')
-      .replace(/\\\\/g, "\\");
-  }
-  console.error("Failed to extract code from:", value);
-  return value;
+const MAX_RECONNECT_ATTEMPTS = 5;
+
+// Payload of a "code" event: one rewrite per file covering issue_ids (the
+// first is issue_id), either as full files or as a unified diff against an
+// original that is fetched separately by its git blob sha
+type CodeEvent = {
+  issue_id: number;
+  issue_ids: number[];
+  path: string;
+  original?: string;
+  optimized?: string;
+  original_sha?: string;
+  diff?: string;
 };
 
 export default function TreeLoading() {
@@ -52,120 +55,189 @@ export default function TreeLoading() {
     }
 
     const baseUrl = import.meta.env.VITE_API_URL;
-    const fullUrl = `${baseUrl}analyze?github_url=${encodeURIComponent(repoUrl)}`;
-
-    console.log("Connecting to EventSource URL:", fullUrl);
+    const sseHeaders = { "ngrok-skip-browser-warning": "true" };
 
-    const eventSource = new EventSourcePolyfill(fullUrl, {
-      headers: {
-        "ngrok-skip-browser-warning": "true",
-      },
-    });
-
-    eventSource.onopen = () => {
-      console.log("[SSE Connection OPENED]");
-    };
+    let eventSource: EventSourcePolyfill | null = null;
+    let cancelled = false;
+    let streamErrors = 0;
+    // Highest event id handled; a reconnect that replays older ids is ignored
+    let lastSeenId = -1;
 
     let issues: any[] = [];
     let metrics: any = null;
     let carbon: string | null = null;
-    let files: { filename: string; original: string; optimized: string }[] = [];
+    const codeEvents: CodeEvent[] = [];
 
-    const handlers: { [key: string]: (value: string) => void } = {
-      carbon_per_view: (value) => {
-        try {
-          if (!value) {
-            throw new Error("carbon_per_view value is empty or undefined.");
-          }
-          const parsed = parseFloat(value);
-          if (isNaN(parsed)) {
-            throw new Error(
-              "carbon_per_view value is not a valid number: " + value
-            );
+    // Fetch each original once, even if several events share it
+    const originals = new Map<string, Promise<string>>();
+    const fetchOriginal = (sha: string) => {
+      let original = originals.get(sha);
+      if (!original) {
+        original = fetch(`${baseUrl}originals/${sha}`, { headers: sseHeaders }).then(
+          (response) => {
+            if (!response.ok) throw new Error(`Original ${sha} not found`);
+            return response.text();
           }
-          carbon = Number(parsed.toFixed(4));
-          console.log("carbon", carbon);
-        } catch (err) {
-          console.error("Failed to parse carbon_per_view:", err);
+        );
+        originals.set(sha, original);
+      }
+      return original;
+    };
+
+    const resolveFile = async (event: CodeEvent) => {
+      if (event.diff === undefined || !event.original_sha) {
+        return {
+          filename: event.path,
+          original: event.original ?? "",
+          optimized: event.optimized ?? "",
+        };
+      }
+      const original = await fetchOriginal(event.original_sha);
+      const optimized = applyPatch(original, event.diff);
+      if (optimized === false) {
+        console.error("Failed to apply diff for", event.path);
+      }
+      return {
+        filename: event.path,
+        original,
+        optimized: optimized === false ? original : optimized,
+      };
+    };
+
+    const handlers: { [event: string]: (data: any) => void } = {
+      carbon_per_view: (value) => {
+        const parsed = parseFloat(value);
+        if (isNaN(parsed)) {
+          console.error("carbon_per_view value is not a valid number:", value);
+          return;
         }
+        carbon = Number(parsed.toFixed(4));
+        console.log("carbon", carbon);
       },
       metrics: (value) => {
-        try {
-          metrics = JSON.parse(value);
-          console.log("value" + value);
-        } catch (err) {
-          console.error("Failed to parse metrics:", err);
-        }
+        metrics = value;
       },
       issues: (value) => {
-        try {
-          issues = JSON.parse(value);
-        } catch (err) {
-          console.error("Failed to parse issues:", err);
-        }
+        issues = value;
+      },
+      code: (value: CodeEvent) => {
+        codeEvents.push(value);
       },
-      path: (value) =>
-        files.push({ filename: value, original: "", optimized: "" }),
-      original: (value) => {
-        const lastFile = files[files.length - 1];
-        const extractedCode = extractCode(value);
-        if (lastFile) lastFile.original = extractedCode;
+      failed: (value) => {
+        console.error("[SSE] Analysis failed:", value?.message);
+        eventSource?.close();
+        setAnalysisComplete(true);
       },
-      optimized: (value) => {
-        const lastFile = files[files.length - 1];
-        const extractedCode = extractCode(value);
-        if (lastFile) lastFile.optimized = extractedCode;
+      done: async () => {
+        console.log("[SSE] All done received!");
+        eventSource?.close();
+
+        // Results arrive in completion order; issue_id restores issue order
+        const sorted = [...codeEvents].sort((a, b) => a.issue_id - b.issue_id);
+        const files = await Promise.all(
+          sorted.map((event) =>
+            resolveFile(event).catch((err) => {
+              console.error("Failed to load original for", event.path, err);
+              return null;
+            })
+          )
+        );
+        if (cancelled) return;
+
+        console.log("[FINAL DATA BEFORE SETTING CONTEXT]", {
+          carbon,
+          metrics,
+          issues,
+          files,
+        });
+
+        setAnalysisData({
+          carbon,
+          issues,
+          metrics,
+          files: files.filter((file) => file !== null),
+        });
+
+        setAnalysisComplete(true);
       },
     };
 
-    eventSource.onmessage = (event) => {
-      const data = event.data;
-      console.log("[SSE]", data);
-
-      let matched = false;
-      for (const key in handlers) {
-        if (data.startsWith(`${key}:`)) {
-          const value = data.slice(key.length + 1).trim();
-          handlers[key](value);
-          matched = true;
-          break;
-        }
-      }
+    const isNewEvent = (event: MessageEvent) => {
+      const id = parseInt(event.lastEventId, 10);
+      if (isNaN(id)) return true;
+      if (id <= lastSeenId) return false;
+      lastSeenId = id;
+      return true;
+    };
 
-      if (!matched) {
-        if (data.includes("All done")) {
-          console.log("[SSE] All done received!");
-          console.log("[FINAL DATA BEFORE SETTING CONTEXT]", {
-            carbon,
-            metrics,
-            issues,
-            files,
-          });
-
-          eventSource.close();
-
-          setAnalysisData({
-            carbon,
-            issues,
-            metrics,
-            files,
-          });
-
-          setAnalysisComplete(true);
-        } else {
-          console.log("[SSE PROGRESS LOG]", data);
-        }
+    const addHandlers = (source: EventSourcePolyfill) => {
+      for (const name in handlers) {
+        source.addEventListener(name, (event: Event) => {
+          if (!isNewEvent(event as MessageEvent)) return;
+          let data: any;
+          try {
+            data = JSON.parse((event as MessageEvent).data);
+          } catch (err) {
+            console.error(`Failed to parse ${name} event:`, err);
+            return;
+          }
+          handlers[name](data);
+        });
       }
     };
 
-    eventSource.onerror = (err) => {
+    // Untyped messages are progress logs
+    const handleMessage = (event: MessageEvent) => {
+      if (!isNewEvent(event)) return;
+      console.log("[SSE PROGRESS LOG]", event.data);
+    };
+
+    // The polyfill reconnects with ?last_event_id=, so the job resumes where it left off
+    const handleError = (err: unknown) => {
+      streamErrors += 1;
       console.error("[SSE ERROR]", err);
-      eventSource.close();
-      setAnalysisComplete(true);
+      if (streamErrors >= MAX_RECONNECT_ATTEMPTS) {
+        eventSource?.close();
+        setAnalysisComplete(true);
+      }
     };
 
+    const startJob = async () => {
+      try {
+        const response = await fetch(
+          `${baseUrl}jobs?github_url=${encodeURIComponent(repoUrl)}`,
+          { method: "POST", headers: sseHeaders }
+        );
+        if (!response.ok) throw new Error("Failed to start analysis job");
+        const { job_id } = await response.json();
+        if (cancelled) return;
+
+        const eventsUrl = `${baseUrl}jobs/${job_id}/events`;
+        console.log("Connecting to EventSource URL:", eventsUrl);
+
+        eventSource = new EventSourcePolyfill(eventsUrl, {
+          headers: sseHeaders,
+          lastEventIdQueryParameterName: "last_event_id",
+        });
+        // streamErrors is not reset here: a job that closes its stream
+        // without a terminal event would otherwise be reconnected forever
+        eventSource.onopen = () => {
+          console.log("[SSE Connection OPENED]");
+        };
+        eventSource.onmessage = handleMessage;
+        addHandlers(eventSource);
+        eventSource.onerror = handleError;
+      } catch (err) {
+        console.error("Failed to start analysis:", err);
+        setAnalysisComplete(true);
+      }
+    };
+
+    startJob();
+
     return () => {
-      eventSource.close();
+      cancelled = true;
+      eventSource?.close();
     };
   }, [navigate, repoUrl, setAnalysisData]);
 